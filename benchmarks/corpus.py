@@ -0,0 +1,82 @@
+"""
+Benchmark-Korpus
+Gespeicherte Presseportal-Seiten liegen in fixtures/, PDFs, DOCX und lange
+Meldungen werden deterministisch nach fixtures/generated/ erzeugt.
+"""
+import random
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+GENERATED_DIR = FIXTURE_DIR / "generated"
+
+SENTENCES = (
+    "Die Stadtverwaltung hat am Dienstag ein neues Förderprogramm für Vereine vorgestellt.",
+    "Insgesamt stehen dafür 250.000 Euro aus dem Haushalt des Landkreises zur Verfügung.",
+    "„Wir wollen das Ehrenamt gezielt stärken“, sagte Bürgermeisterin Maria Beispiel.",
+    "Anträge können bis zum 30. Juni im Rathaus oder online eingereicht werden.",
+    "Die Feuerwehr rückte gegen 14.20 Uhr mit drei Fahrzeugen und 24 Einsatzkräften aus.",
+    "Verletzt wurde nach Angaben der Polizei niemand, der Sachschaden liegt bei etwa 15.000 Euro.",
+    "Die Veranstaltung beginnt am Sonnabend um 10 Uhr auf dem Marktplatz, der Eintritt ist frei.",
+    "Im vergangenen Jahr kamen nach Angaben der Veranstalter rund 8000 Besucherinnen und Besucher.",
+    "Das Projekt wird gemeinsam mit der Hochschule Hannover und zwei regionalen Unternehmen umgesetzt.",
+    "Weitere Informationen gibt es unter der Telefonnummer 0511 123456 sowie auf der Internetseite der Gemeinde.",
+)
+
+
+def synthetic_release(paragraphs=40, seed=0):
+    """Lange, deutschsprachige Pressemitteilung aus Textbausteinen"""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(paragraphs):
+        sentences = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 7)))
+        parts.append(f"Absatz {i + 1}. {sentences}")
+    return "\n\n".join(parts)
+
+
+def synthetic_presseportal_html(paragraphs=200, seed=0):
+    """Saved-Page-Fixture mit stark verlängertem Artikeltext"""
+    base = (FIXTURE_DIR / "presseportal_blaulicht.html").read_text(encoding="utf-8")
+    body = "".join(f"<p>{p}</p>\n" for p in synthetic_release(paragraphs, seed).split("\n\n"))
+    return base.replace('<p>Rückfragen bitte an:</p>', body + '<p>Rückfragen bitte an:</p>', 1)
+
+
+def _write_pdf(path, pages, seed):
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = " ".join(rng.choice(SENTENCES) for _ in range(18))
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def _write_docx(path, paragraphs, seed):
+    import docx
+
+    document = docx.Document()
+    for para in synthetic_release(paragraphs, seed).split("\n\n"):
+        document.add_paragraph(para)
+    document.save(path)
+
+
+def build_corpus(target_dir=GENERATED_DIR):
+    """Erzeugt (einmalig) alle generierten Fixtures und gibt {name: Pfad} zurück"""
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    builders = {
+        "small.pdf": lambda p: _write_pdf(p, pages=2, seed=1),
+        "large.pdf": lambda p: _write_pdf(p, pages=80, seed=2),
+        "small.docx": lambda p: _write_docx(p, paragraphs=10, seed=3),
+        "large.docx": lambda p: _write_docx(p, paragraphs=400, seed=4),
+        "long_release.txt": lambda p: p.write_text(synthetic_release(300, seed=5), encoding="utf-8"),
+    }
+    corpus = {}
+    for name, build in builders.items():
+        path = target_dir / name
+        if not path.exists():
+            build(path)
+        corpus[name] = path
+    return corpus
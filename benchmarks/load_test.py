@@ -0,0 +1,273 @@
+"""
+Lasttest: simuliert gleichzeitige Redakteurs-Sessions
+
+Wie in app.py teilen sich alle Sessions einen WorkflowProcessor (st.cache_resource),
+jede Session läuft in ihrem eigenen Thread. Die LLM-Aufrufe gehen an das Fake-Backend,
+Scraping an einen lokalen HTTP-Server, der die gespeicherte Presseportal-Seite ausliefert.
+
+Beispiele:
+    python benchmarks/load_test.py --sessions 50 --rate 2 --llm-latency-ms 800
+    python benchmarks/load_test.py --sessions 200 --rate 10 --max-active 16 --scrape-latency-ms 300
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from corpus import FIXTURE_DIR, build_corpus, synthetic_release  # noqa: E402
+from run_benchmarks import PROMPT_CONFIGS, named_file, setup_offline_env  # noqa: E402
+
+STEPS = ("scrape", "parsing", "extract", "draft", "write", "check")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(values):
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "mean_s": statistics.fmean(values),
+        "p50_s": percentile(values, 50),
+        "p90_s": percentile(values, 90),
+        "p99_s": percentile(values, 99),
+        "max_s": max(values),
+    }
+
+
+def current_rss_mb():
+    """Aktueller Resident Set Size (Linux /proc), sonst Peak via resource"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class PresseportalStandIn:
+    """Lokaler HTTP-Server mit der Fixture-Seite; URL enthält 'presseportal.de' für den Scraper"""
+
+    def __init__(self, latency_ms=0):
+        html = (FIXTURE_DIR / "presseportal_blaulicht.html").read_bytes()
+        delay = latency_ms / 1000
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if delay:
+                    time.sleep(delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(html)))
+                self.end_headers()
+                self.wfile.write(html)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/www.presseportal.de/blaulicht/pm/66841/123456"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+class LoadTest:
+    def __init__(self, processor, sessions, rate, max_active, url, attachments, seed=0):
+        self.processor = processor
+        self.sessions = sessions
+        self.rate = rate
+        self.slots = threading.Semaphore(max_active) if max_active else None
+        self.url = url
+        self.attachments = attachments
+        self.rng = random.Random(seed)
+        self.records = []
+        self.memory_samples = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _session(self, index, arrival):
+        record = {"session": index, "arrival": arrival, "error": None}
+        if self.slots:
+            self.slots.acquire()
+        try:
+            record["start"] = time.perf_counter()
+            results = self.processor.run_workflow(
+                uploaded_files=[named_file(p) for p in self.attachments],
+                meta_input=f"Session {index}",
+                text_input=synthetic_release(paragraphs=8, seed=index),
+                url_input=self.url,
+                prompt_configs=PROMPT_CONFIGS,
+                model_settings={"model": "load-test", "temp": 0.1}
+            )
+            record["timings"] = results.get("timings", {})
+            if any(isinstance(results.get(k), dict) and "error" in results[k] for k in ("json", "concept", "article")):
+                record["error"] = "json_fallback"
+        except Exception as e:
+            record["error"] = type(e).__name__
+            record["timings"] = {}
+        finally:
+            record["end"] = time.perf_counter()
+            if self.slots:
+                self.slots.release()
+            with self._lock:
+                self.records.append(record)
+
+    def _sample_memory(self, t0):
+        while not self._done.is_set():
+            self.memory_samples.append((time.perf_counter() - t0, current_rss_mb()))
+            self._done.wait(0.5)
+
+    def run(self):
+        t0 = time.perf_counter()
+        sampler = threading.Thread(target=self._sample_memory, args=(t0,), daemon=True)
+        sampler.start()
+
+        threads = []
+        next_arrival = t0
+        for i in range(self.sessions):
+            # Poisson-Ankünfte: exponentialverteilte Abstände
+            next_arrival += self.rng.expovariate(self.rate) if self.rate > 0 else 0
+            time.sleep(max(0.0, next_arrival - time.perf_counter()))
+            thread = threading.Thread(target=self._session, args=(i, time.perf_counter()), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        wall = time.perf_counter() - t0
+        self._done.set()
+        sampler.join()
+        return self.report(wall)
+
+    def report(self, wall):
+        ok = [r for r in self.records if not r["error"]]
+        errors = {}
+        for r in self.records:
+            if r["error"]:
+                errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+        steps = {}
+        for step in STEPS:
+            values = [r["timings"][step] for r in self.records if step in r.get("timings", {})]
+            if values:
+                steps[step] = latency_summary(values)
+
+        memory = [m for _, m in self.memory_samples]
+        return {
+            "sessions": self.sessions,
+            "wall_s": wall,
+            "throughput_runs_per_min": len(ok) / wall * 60 if wall else 0,
+            "error_rate": (len(self.records) - len(ok)) / len(self.records) if self.records else 0,
+            "errors": errors,
+            "queue_delay": latency_summary([r["start"] - r["arrival"] for r in self.records if "start" in r]),
+            "end_to_end": latency_summary([r["end"] - r["arrival"] for r in self.records]),
+            "steps": steps,
+            "memory_mb": {
+                "start": memory[0] if memory else None,
+                "peak": max(memory) if memory else None,
+                "end": memory[-1] if memory else None,
+                "growth": (memory[-1] - memory[0]) if memory else None,
+            },
+            "memory_samples": self.memory_samples,
+        }
+
+
+def print_report(report):
+    def ms(v):
+        return f"{v * 1000:8.0f}" if v is not None else "       -"
+
+    print(f"\nSessions: {report['sessions']}  Wall: {report['wall_s']:.1f}s  "
+          f"Durchsatz: {report['throughput_runs_per_min']:.1f} Läufe/min  Fehlerquote: {report['error_rate']:.1%}")
+    if report["errors"]:
+        print(f"Fehler: {report['errors']}")
+    print(f"\n{'Latenz (ms)':16s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>8s}")
+    rows = [("Warteschlange", report["queue_delay"]), ("End-to-End", report["end_to_end"])]
+    rows += [(f"  {name}", stats) for name, stats in report["steps"].items()]
+    for name, stats in rows:
+        if stats:
+            print(f"{name:16s} {ms(stats['p50_s'])} {ms(stats['p90_s'])} {ms(stats['p99_s'])} {ms(stats['max_s'])}")
+    mem = report["memory_mb"]
+    if mem["start"] is not None:
+        print(f"\nRSS: Start {mem['start']:.0f} MB, Peak {mem['peak']:.0f} MB, Ende {mem['end']:.0f} MB (Wachstum {mem['growth']:+.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest mit simulierten Redakteurs-Sessions")
+    parser.add_argument("--sessions", type=int, default=20, help="Anzahl Sessions insgesamt")
+    parser.add_argument("--rate", type=float, default=1.0, help="Ankunftsrate (Sessions pro Sekunde, Poisson)")
+    parser.add_argument("--max-active", type=int, default=0, help="Max. gleichzeitig laufende Workflows (0 = unbegrenzt)")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Median-Latenz des Fake-LLM")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.3)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--scrape-latency-ms", type=float, default=100, help="Antwortzeit des Presseportal-Stand-ins")
+    parser.add_argument("--no-scrape", action="store_true")
+    parser.add_argument("--attachments", default="small.pdf", help="Komma-getrennt aus dem Korpus, leer = keine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "load_test.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_offline_env(tmp_dir)
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+        os.environ["FAKE_LLM_LATENCY_SIGMA"] = str(args.llm_latency_sigma)
+        os.environ["FAKE_LLM_ERROR_RATE"] = str(args.llm_error_rate)
+        os.environ["FAKE_LLM_SEED"] = str(args.seed)
+
+        from config import Config
+        from workflow import WorkflowProcessor
+
+        corpus = build_corpus()
+        attachments = [corpus[name] for name in args.attachments.split(",") if name]
+        processor = WorkflowProcessor(Config())
+
+        with PresseportalStandIn(args.scrape_latency_ms) as stand_in:
+            test = LoadTest(
+                processor,
+                sessions=args.sessions,
+                rate=args.rate,
+                max_active=args.max_active,
+                url="" if args.no_scrape else stand_in.url,
+                attachments=attachments,
+                seed=args.seed
+            )
+            report = test.run()
+
+    report["parameters"] = vars(args)
+    print_report(report)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nErgebnisse: {output}")
+
+
+if __name__ == "__main__":
+    main()
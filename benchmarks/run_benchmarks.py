@@ -0,0 +1,295 @@
+"""
+End-to-End Benchmarks für die Redaktions-Pipeline
+
+Beispiele:
+    python benchmarks/run_benchmarks.py --output benchmarks/results/current.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json --threshold 0.15
+    python benchmarks/run_benchmarks.py --only scrape_parse,document_parse_pdf_large
+
+Die LLM-Aufrufe laufen gegen das Fake-Backend (LLM_BACKEND=fake, Latenz 0),
+gemessen wird also nur der Overhead der Pipeline selbst.
+Exit-Code 1, wenn ein Benchmark langsamer als Baseline * (1 + threshold) ist.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+ROOT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from corpus import FIXTURE_DIR, build_corpus, synthetic_presseportal_html, synthetic_release  # noqa: E402
+
+PROMPT_CONFIGS = {
+    "extract": {"name": "prompt_extract", "source": "file", "version": "latest"},
+    "draft":   {"name": "prompt_draft", "source": "file", "version": "latest"},
+    "write":   {"name": "prompt_write", "source": "file", "version": "latest"},
+    "check":   {"name": "prompt_check", "source": "file", "version": "latest"}
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name, repeat=5):
+    """Registriert einen Benchmark. Die Setup-Funktion gibt (callable, extra-Metriken als dict) zurück."""
+    def decorator(func):
+        BENCHMARKS[name] = {"setup": func, "repeat": repeat}
+        return func
+    return decorator
+
+
+def measure(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "median_s": statistics.median(ordered),
+        "min_s": ordered[0],
+        "p95_s": ordered[p95_index],
+        "runs": len(ordered),
+    }
+
+
+def setup_offline_env(tmp_dir):
+    """Fake-LLM ohne Latenz, kein Langfuse, Run Store im Temp-Verzeichnis"""
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = "0"
+    os.environ["FAKE_LLM_ERROR_RATE"] = "0"
+    os.environ["KLT_DATA_DIR"] = str(tmp_dir)
+    for key in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST", "LANGFUSE_BASE_URL"):
+        os.environ.pop(key, None)
+
+
+def named_file(path):
+    from document_parser import NamedBytesIO
+    return NamedBytesIO(Path(path).name, Path(path).read_bytes())
+
+
+# ----------------------------------------------------------------
+# BENCHMARKS
+# ----------------------------------------------------------------
+
+@benchmark("scrape_parse", repeat=20)
+def bench_scrape_parse(ctx):
+    from web_scraper import PresseportalScraper
+    scraper = PresseportalScraper()
+    html = (FIXTURE_DIR / "presseportal_blaulicht.html").read_text(encoding="utf-8")
+    url = "https://www.presseportal.de/blaulicht/pm/66841/123456"
+    return lambda: scraper.format_for_llm(scraper.parse_html(html, url)), {"bytes": len(html.encode("utf-8"))}
+
+
+@benchmark("scrape_parse_long", repeat=10)
+def bench_scrape_parse_long(ctx):
+    from web_scraper import PresseportalScraper
+    scraper = PresseportalScraper()
+    html = synthetic_presseportal_html(paragraphs=300)
+    url = "https://www.presseportal.de/blaulicht/pm/66841/123456"
+    return lambda: scraper.format_for_llm(scraper.parse_html(html, url)), {"bytes": len(html.encode("utf-8"))}
+
+
+def _document_bench(ctx, filename):
+    from document_parser import DocumentParser
+    path = ctx["corpus"][filename]
+    data = path.read_bytes()
+    extra = {"bytes": len(data)}
+    if filename.endswith(".pdf"):
+        import fitz
+        with fitz.open(path) as doc:
+            extra["pages"] = doc.page_count
+    return lambda: DocumentParser.parse_uploaded_files([named_file(path)]), extra
+
+
+@benchmark("document_parse_pdf_small", repeat=20)
+def bench_pdf_small(ctx):
+    return _document_bench(ctx, "small.pdf")
+
+
+@benchmark("document_parse_pdf_large", repeat=5)
+def bench_pdf_large(ctx):
+    return _document_bench(ctx, "large.pdf")
+
+
+@benchmark("document_parse_docx_small", repeat=20)
+def bench_docx_small(ctx):
+    return _document_bench(ctx, "small.docx")
+
+
+@benchmark("document_parse_docx_large", repeat=5)
+def bench_docx_large(ctx):
+    return _document_bench(ctx, "large.docx")
+
+
+@benchmark("prompt_loading", repeat=50)
+def bench_prompt_loading(ctx):
+    from prompt_manager import PromptManager
+    manager = PromptManager(ROOT_DIR / "prompts")
+
+    def run():
+        for cfg in PROMPT_CONFIGS.values():
+            manager.load_prompt_by_config(cfg)
+    return run, {"prompts": len(PROMPT_CONFIGS)}
+
+
+@benchmark("json_postprocessing", repeat=50)
+def bench_json_postprocessing(ctx):
+    from llm_backend import FakeBackend
+    from workflow import WorkflowProcessor
+    fake = FakeBackend(latency_ms=0, output_tokens=4000)
+    system_prompt = (ROOT_DIR / "prompts" / "prompt_extract.md").read_text(encoding="utf-8")
+    text = "```json\n" + fake.generate("bench", "input", system_prompt, json_mode=True).text + "\n```"
+    return lambda: WorkflowProcessor.parse_json_response(text), {"bytes": len(text.encode("utf-8"))}
+
+
+@benchmark("pipeline_overhead", repeat=5)
+def bench_pipeline(ctx):
+    from config import Config
+    from workflow import WorkflowProcessor
+    processor = WorkflowProcessor(Config())
+    text = synthetic_release(paragraphs=60, seed=7)
+
+    def run():
+        processor.logger.clear()
+        processor.run_workflow(
+            uploaded_files=[named_file(ctx["corpus"]["small.pdf"]), named_file(ctx["corpus"]["small.docx"])],
+            meta_input="Absender: Stadt Beispielstadt",
+            text_input=text,
+            url_input="",
+            prompt_configs=PROMPT_CONFIGS,
+            model_settings={"model": "bench-model", "temp": 0.1}
+        )
+    return run, {"llm_backend": "fake"}
+
+
+@benchmark("pipeline_long_release", repeat=3)
+def bench_pipeline_long_release(ctx):
+    """Lange Meldung + großes PDF: Token-Budget (Kürzen) und kompakte Inter-Step-Payloads"""
+    from config import Config
+    from workflow import WorkflowProcessor
+    processor = WorkflowProcessor(Config())
+    text = ctx["corpus"]["long_release.txt"].read_text(encoding="utf-8")
+    extra = {"llm_backend": "fake", "bytes": len(text.encode("utf-8"))}
+
+    def run():
+        processor.logger.clear()
+        results = processor.run_workflow(
+            uploaded_files=[named_file(ctx["corpus"]["large.pdf"])],
+            meta_input="Absender: Stadt Beispielstadt",
+            text_input=text,
+            url_input="",
+            prompt_configs=PROMPT_CONFIGS,
+            model_settings={"model": "bench-model", "temp": 0.1}
+        )
+        # Wird nach der Messung in das Ergebnis übernommen (letzter Lauf)
+        extra["input_trimmed_chars"] = sum((results.get("input_trimmed") or {}).values())
+        extra["payload_tokens_saved"] = sum(p["before"] - p["after"] for p in (results.get("payload_stats") or {}).values())
+    return run, extra
+
+
+# ----------------------------------------------------------------
+# AUSWERTUNG
+# ----------------------------------------------------------------
+
+def add_throughput(result, extra):
+    median = result["median_s"] or 1e-12
+    if "bytes" in extra:
+        result["mb_per_s"] = extra["bytes"] / 1e6 / median
+    if "pages" in extra:
+        result["pages_per_s"] = extra["pages"] / median
+    result.update(extra)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Gibt Liste der Regressionen zurück: (name, baseline_s, current_s, ratio)"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+        ratio = current["median_s"] / base["median_s"]
+        current["baseline_median_s"] = base["median_s"]
+        current["ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append((name, base["median_s"], current["median_s"], ratio))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks für die Redaktions-Pipeline")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "latest.json"))
+    parser.add_argument("--baseline", help="JSON-Ergebnis eines früheren Laufs zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Erlaubte Verlangsamung (0.2 = +20%%)")
+    parser.add_argument("--only", help="Komma-getrennte Liste von Benchmark-Namen")
+    parser.add_argument("--repeat-factor", type=float, default=1.0, help="Skaliert die Wiederholungen")
+    args = parser.parse_args()
+
+    selected = list(BENCHMARKS)
+    if args.only:
+        selected = [n for n in args.only.split(",") if n in BENCHMARKS]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_offline_env(tmp_dir)
+        ctx = {"corpus": build_corpus()}
+
+        results = {}
+        for name in selected:
+            spec = BENCHMARKS[name]
+            func, extra = spec["setup"](ctx)
+            repeat = max(1, int(spec["repeat"] * args.repeat_factor))
+            results[name] = add_throughput(summarize(measure(func, repeat)), extra)
+            print(f"{name:32s} median {results[name]['median_s'] * 1000:9.2f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = [{"name": r[0], "baseline_s": r[1], "current_s": r[2], "ratio": r[3]} for r in regressions]
+        for name, base_s, cur_s, ratio in regressions:
+            print(f"REGRESSION {name}: {base_s * 1000:.2f} ms -> {cur_s * 1000:.2f} ms ({ratio:.2f}x)")
+        exit_code = 1 if regressions else 0
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Ergebnisse: {output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Startup-Benchmark: Import-Zeiten und Time-to-First-Render der Streamlit-App
+
+Beispiele:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --baseline benchmarks/results/startup_baseline.json --threshold 0.25
+
+Jede Messung läuft in einem frischen Python-Prozess (kalter Modul-Cache).
+time_to_first_render: Prozessstart -> erster vollständiger Durchlauf von app.py
+über streamlit.testing (AppTest), inklusive aller Imports und der Initialisierung.
+Langfuse ist deaktiviert, das LLM-Backend ist das Fake-Backend (kein Netzwerk).
+Exit-Code 1, wenn eine Messung langsamer als Baseline * (1 + threshold) ist.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+ROOT_DIR = BENCH_DIR.parent
+SRC_DIR = ROOT_DIR / "src"
+sys.path.insert(0, str(BENCH_DIR))
+
+from run_benchmarks import compare, git_revision, setup_offline_env, summarize  # noqa: E402
+
+# Module, deren Import-Zeit einzeln verfolgt wird (eigene Module + schwere Abhängigkeiten)
+IMPORT_TARGETS = [
+    "config", "workflow", "prompt_discovery", "document_parser", "web_scraper",
+    "streamlit", "google.genai", "langfuse", "fitz", "docx", "bs4", "requests",
+]
+
+# Schwere Abhängigkeiten, die nach dem App-Start noch NICHT geladen sein sollen
+LAZY_MODULES = ["google.genai", "langfuse", "fitz", "docx", "bs4"]
+
+IMPORT_SNIPPET = """
+import sys, time, json
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+RENDER_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "exception": bool(at.exception),
+    "loaded": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_snippet(code):
+    """Führt den Code in einem frischen Interpreter aus und gibt die letzte JSON-Zeile zurück"""
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, env=os.environ.copy()
+    )
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "kein Ergebnis")
+    return json.loads(lines[-1])
+
+
+def bench_import(module, repeat):
+    times = []
+    for _ in range(repeat):
+        times.append(run_snippet(IMPORT_SNIPPET.format(src=str(SRC_DIR), module=module))["seconds"])
+    return summarize(times)
+
+
+def bench_first_render(repeat):
+    times, loaded, exceptions = [], set(), 0
+    for _ in range(repeat):
+        result = run_snippet(RENDER_SNIPPET.format(src=str(SRC_DIR), app=str(SRC_DIR / "app.py"), lazy=LAZY_MODULES))
+        times.append(result["seconds"])
+        loaded.update(result["loaded"])
+        exceptions += result["exception"]
+    summary = summarize(times)
+    summary["eager_heavy_modules"] = sorted(loaded)
+    summary["exceptions"] = exceptions
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-Benchmark (Import-Zeiten, Time-to-First-Render)")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "startup_latest.json"))
+    parser.add_argument("--baseline", help="JSON-Ergebnis eines früheren Laufs zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Erlaubte Verlangsamung (0.25 = +25%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="Messungen pro Ziel (je ein frischer Prozess)")
+    parser.add_argument("--skip-imports", action="store_true", help="Nur Time-to-First-Render messen")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_offline_env(tmp_dir)
+
+        if not args.skip_imports:
+            for module in IMPORT_TARGETS:
+                try:
+                    results[f"import_{module}"] = bench_import(module, args.repeat)
+                except RuntimeError as e:
+                    print(f"import_{module:28s} übersprungen ({e})")
+                    continue
+                print(f"import_{module:28s} median {results[f'import_{module}']['median_s'] * 1000:9.1f} ms")
+
+        results["time_to_first_render"] = bench_first_render(args.repeat)
+        render = results["time_to_first_render"]
+        print(f"{'time_to_first_render':35s} median {render['median_s'] * 1000:9.1f} ms")
+        if render["eager_heavy_modules"]:
+            print(f"WARNUNG: beim Start geladen: {', '.join(render['eager_heavy_modules'])}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = [{"name": r[0], "baseline_s": r[1], "current_s": r[2], "ratio": r[3]} for r in regressions]
+        for name, base_s, cur_s, ratio in regressions:
+            print(f"REGRESSION {name}: {base_s * 1000:.1f} ms -> {cur_s * 1000:.1f} ms ({ratio:.2f}x)")
+        exit_code = 1 if regressions else 0
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Ergebnisse: {output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+HTTP API Server
+Programmatischer Zugriff auf den WorkflowProcessor (z.B. für das CMS).
+
+Start: python src/api_server.py --host 127.0.0.1 --port 8080
+
+Endpunkte:
+    POST /runs                      Lauf starten (URL/Text/Anhänge + Prompt-Configs, max_fix_iterations)
+    GET  /runs/{run_id}             Status, Status-Meldungen, verfügbare Schritte
+    GET  /runs/{run_id}/events      Status-Stream (Server-Sent Events)
+    GET  /runs/{run_id}/steps/{s}   Ergebnis eines Schritts (json, concept, article, check, ...)
+    POST /batches                   Mehrere Läufe auf einmal starten
+    GET  /batches/{batch_id}        Status aller Läufe eines Batches
+    GET  /health
+
+Nebenläufigkeit: Der Workflow ist synchron, jeder aktive Lauf belegt für seine
+gesamte Pipeline einen Worker-Thread. Gleichzeitig aktiv sind daher höchstens
+API_MAX_CONCURRENT_RUNS (Default 16) Läufe; weitere warten ohne Thread in der
+Queue. Der Wert begrenzt also Threads und LLM-Quota zugleich und muss für viele
+parallele Läufe entsprechend hoch gesetzt werden (ein Thread pro aktivem Lauf).
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from aiohttp import web
+
+from config import Config
+from document_parser import NamedBytesIO
+from run_store import RunStore
+from workflow import WorkflowProcessor
+
+DEFAULT_PROMPT_CONFIGS = {
+    "extract": {"name": "prompt_extract", "source": "file", "version": "latest"},
+    "draft":   {"name": "prompt_draft", "source": "file", "version": "latest"},
+    "write":   {"name": "prompt_write", "source": "file", "version": "latest"},
+    "check":   {"name": "prompt_check", "source": "file", "version": "latest"},
+    "fix":     {"name": "prompt_fix", "source": "file", "version": "latest"}
+}
+
+FINAL_STATES = ("complete", "error")
+# Abgeschlossene Läufe/Batches bleiben so lange im Speicher (danach Status aus dem Run Store)
+JOB_TTL_S = 3600
+EVICT_INTERVAL_S = 60
+# Der WorkflowLogger des geteilten Processors wird im Server nie geleert -> begrenzen
+LOG_MAX_ENTRIES = 1000
+
+
+class RunJob:
+    """In-Memory Status eines Laufs; die Ergebnisse selbst liegen im Run Store"""
+
+    def __init__(self, run_id, spec):
+        self.run_id = run_id
+        self.spec = spec
+        self.status = "queued"
+        self.error = None
+        self.events = []
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.finished_at = None
+        self._changed = asyncio.Event()
+
+    def push_event(self, message, status=None):
+        if status:
+            self.status = status
+            if status in FINAL_STATES:
+                self.finished_at = time.monotonic()
+        self.events.append({"time": datetime.now().isoformat(timespec="seconds"), "message": message, "status": self.status})
+        # Wartende Stream-Clients aufwecken
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, timeout):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self):
+        return {"run_id": self.run_id, "status": self.status, "error": self.error, "created_at": self.created_at, "events": self.events}
+
+
+class WorkflowAPI:
+    """
+    Nimmt Läufe asynchron an. Wartende Läufe belegen keinen Thread:
+    sie warten als Coroutine auf das Semaphore. Jeder aktive Lauf belegt einen
+    Thread im Worker-Pool (Größe = max_concurrent_runs) bis zum Ende der Pipeline.
+    """
+
+    def __init__(self, config, processor=None, run_store=None, max_concurrent_runs=None):
+        self.config = config
+        self.processor = processor or WorkflowProcessor(config)
+        self.processor.logger.max_entries = LOG_MAX_ENTRIES
+        self.run_store = run_store or RunStore(config.RUN_DB_PATH)
+        limit = max_concurrent_runs or int(config._get_secret("API_MAX_CONCURRENT_RUNS") or 16)
+        self.max_concurrent_runs = limit
+        self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="workflow")
+        self.job_ttl_s = float(config._get_secret("API_JOB_TTL_S") or JOB_TTL_S)
+        self.jobs = {}
+        # batch_id -> {"run_ids": [...], "created": monotonic}
+        self.batches = {}
+        self._semaphore = None
+        self._tasks = set()
+        self._evict_task = None
+
+    # ----------------------------------------------------------------
+    # APP SETUP
+    # ----------------------------------------------------------------
+
+    def create_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([
+            web.get("/health", self.handle_health),
+            web.post("/runs", self.handle_submit_run),
+            web.get("/runs/{run_id}", self.handle_run_status),
+            web.get("/runs/{run_id}/events", self.handle_run_events),
+            web.get("/runs/{run_id}/steps/{step}", self.handle_run_step),
+            web.post("/batches", self.handle_submit_batch),
+            web.get("/batches/{batch_id}", self.handle_batch_status),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_runs)
+        self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def _on_cleanup(self, app):
+        if self._evict_task:
+            self._evict_task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL_S)
+            self.evict_finished()
+
+    def evict_finished(self, now=None):
+        """Entfernt abgeschlossene Läufe (und deren Batches) nach Ablauf der TTL aus dem Speicher"""
+        now = now or time.monotonic()
+        expired = [run_id for run_id, job in self.jobs.items() if job.finished_at and now - job.finished_at > self.job_ttl_s]
+        for run_id in expired:
+            del self.jobs[run_id]
+        for batch_id, batch in list(self.batches.items()):
+            if now - batch["created"] > self.job_ttl_s and not any(r in self.jobs for r in batch["run_ids"]):
+                del self.batches[batch_id]
+        return len(expired)
+
+    # ----------------------------------------------------------------
+    # RUN AUSFÜHRUNG
+    # ----------------------------------------------------------------
+
+    @staticmethod
+    def _parse_spec(payload):
+        if not isinstance(payload, dict):
+            raise ValueError("Request-Body muss ein JSON-Objekt sein")
+
+        attachments = []
+        raw_attachments = payload.get("attachments") or []
+        if not isinstance(raw_attachments, list):
+            raise ValueError("'attachments' muss eine Liste sein")
+        for item in raw_attachments:
+            if not isinstance(item, dict) or not item.get("name") or "content_base64" not in item:
+                raise ValueError("Anhänge brauchen 'name' und 'content_base64'")
+            try:
+                data = base64.b64decode(item["content_base64"], validate=True)
+            except (binascii.Error, TypeError, ValueError):
+                raise ValueError(f"Anhang '{item['name']}': 'content_base64' ist kein gültiges Base64")
+            attachments.append({"name": item["name"], "data": data})
+
+        custom_configs = payload.get("prompt_configs") or {}
+        if not isinstance(custom_configs, dict):
+            raise ValueError("'prompt_configs' muss ein Objekt sein")
+        for step, config in custom_configs.items():
+            if not isinstance(config, dict) or not isinstance(config.get("name"), str) or not config["name"]:
+                raise ValueError(f"Prompt-Config '{step}' muss ein Objekt mit 'name' sein")
+        prompt_configs = dict(DEFAULT_PROMPT_CONFIGS)
+        prompt_configs.update(custom_configs)
+
+        model_settings = payload.get("model_settings") or {"model": None, "temp": 0.1}
+        if not isinstance(model_settings, dict):
+            raise ValueError("'model_settings' muss ein Objekt sein")
+
+        return {
+            "url": payload.get("url") or "",
+            "meta": payload.get("meta") or "",
+            "text": payload.get("text") or "",
+            "attachments": attachments,
+            "prompt_configs": prompt_configs,
+            "model_settings": model_settings,
+            "max_fix_iterations": int(payload.get("max_fix_iterations", 1)),
+        }
+
+    async def _in_store(self, func, *args):
+        """Run-Store-Zugriffe (SQLite, ggf. Warten auf den Schreib-Lock) nicht auf dem Event Loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _submit(self, spec):
+        inputs = {
+            "url": spec["url"], "meta": spec["meta"], "text": spec["text"],
+            "files": [{"name": a["name"], "size": len(a["data"])} for a in spec["attachments"]],
+        }
+        run_id = await self._in_store(
+            lambda: self.run_store.create_run(
+                inputs, spec["prompt_configs"], spec["model_settings"], label=spec["url"] or None,
+                prompt_texts=self.processor.resolve_prompts(spec["prompt_configs"])
+            )
+        )
+        job = RunJob(run_id, spec)
+        self.jobs[run_id] = job
+        job.push_event("Lauf angenommen", status="queued")
+        task = asyncio.create_task(self._execute(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _execute(self, job):
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            job.push_event("Lauf gestartet", status="running")
+
+            def status_callback(msg):
+                loop.call_soon_threadsafe(job.push_event, msg)
+
+            try:
+                results = await loop.run_in_executor(self.executor, self._run_sync, job.spec, status_callback)
+                await loop.run_in_executor(self.executor, self.run_store.save_results, job.run_id, results)
+                job.push_event("Fertig", status="complete")
+            except Exception as e:
+                job.error = str(e)
+                await self._in_store(lambda: self.run_store.finish_run(job.run_id, status="error", error=str(e)))
+                job.push_event(f"Fehler: {e}", status="error")
+            finally:
+                job.spec = None  # Anhänge freigeben
+
+    def _run_sync(self, spec, status_callback):
+        files = [NamedBytesIO(a["name"], a["data"]) for a in spec["attachments"]]
+        try:
+            return self.processor.run_workflow(
+                uploaded_files=files,
+                meta_input=spec["meta"],
+                text_input=spec["text"],
+                url_input=spec["url"],
+                prompt_configs=spec["prompt_configs"],
+                model_settings=spec["model_settings"],
+                status_callback=status_callback,
+                max_fix_iterations=spec["max_fix_iterations"]
+            )
+        finally:
+            self.processor.flush_stats()
+
+    async def _job_or_stored(self, run_id, run=None):
+        """Status aus dem Speicher oder (nach Neustart) aus dem Run Store"""
+        job = self.jobs.get(run_id)
+        if job:
+            return job.to_dict()
+        run = run or await self._in_store(self.run_store.get_run, run_id)
+        if not run:
+            return None
+        return {"run_id": run_id, "status": run["status"], "error": run["error"], "created_at": run["created_at"], "events": []}
+
+    # ----------------------------------------------------------------
+    # HANDLER
+    # ----------------------------------------------------------------
+
+    async def handle_health(self, request):
+        active = sum(1 for j in self.jobs.values() if j.status == "running")
+        queued = sum(1 for j in self.jobs.values() if j.status == "queued")
+        return web.json_response({"status": "ok", "running": active, "queued": queued, "max_concurrent_runs": self.max_concurrent_runs})
+
+    async def _read_json(self, request):
+        try:
+            return await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "Ungültiges JSON"}), content_type="application/json")
+
+    async def handle_submit_run(self, request):
+        payload = await self._read_json(request)
+        try:
+            spec = self._parse_spec(payload)
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        job = await self._submit(spec)
+        return web.json_response({"run_id": job.run_id, "status": job.status, "status_url": f"/runs/{job.run_id}"}, status=202)
+
+    async def handle_run_status(self, request):
+        run_id = request.match_info["run_id"]
+        run = await self._in_store(self.run_store.get_run, run_id)
+        status = await self._job_or_stored(run_id, run)
+        if not status:
+            return web.json_response({"error": "Unbekannter Lauf"}, status=404)
+        status["steps"] = sorted(run["steps"]) if run else []
+        status["timings"] = run["timings"] if run else {}
+        status["usage"] = run["usage"] if run else {}
+        return web.json_response(status)
+
+    async def handle_run_events(self, request):
+        run_id = request.match_info["run_id"]
+        job = self.jobs.get(run_id)
+        if not job:
+            status = await self._job_or_stored(run_id)
+            if not status:
+                return web.json_response({"error": "Unbekannter Lauf"}, status=404)
+            return web.json_response(status)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        sent = 0
+        while True:
+            while sent < len(job.events):
+                await response.write(f"data: {json.dumps(job.events[sent], ensure_ascii=False)}\n\n".encode("utf-8"))
+                sent += 1
+            if job.status in FINAL_STATES:
+                break
+            await job.wait_for_change(timeout=15)
+            if sent == len(job.events):
+                await response.write(b": keep-alive\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_run_step(self, request):
+        run_id = request.match_info["run_id"]
+        step = request.match_info["step"]
+        value = await self._in_store(self.run_store.load_step, run_id, step)
+        if value is None:
+            return web.json_response({"error": f"Schritt '{step}' nicht vorhanden"}, status=404)
+        return web.json_response({"run_id": run_id, "step": step, "result": value})
+
+    async def handle_submit_batch(self, request):
+        payload = await self._read_json(request)
+        items = payload.get("runs") if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items:
+            return web.json_response({"error": "'runs' muss eine nicht-leere Liste sein"}, status=400)
+        try:
+            specs = [self._parse_spec(item) for item in items]
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        batch_id = uuid.uuid4().hex
+        run_ids = [(await self._submit(spec)).run_id for spec in specs]
+        self.batches[batch_id] = {"run_ids": run_ids, "created": time.monotonic()}
+        return web.json_response({"batch_id": batch_id, "run_ids": run_ids, "status_url": f"/batches/{batch_id}"}, status=202)
+
+    async def handle_batch_status(self, request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": "Unbekannter Batch"}, status=404)
+        run_ids = batch["run_ids"]
+        runs = [{"run_id": r, "status": ((await self._job_or_stored(r)) or {}).get("status")} for r in run_ids]
+        counts = {}
+        for r in runs:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        return web.json_response({"batch_id": request.match_info["batch_id"], "counts": counts, "runs": runs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API für den Editorial Workflow")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrent-runs", type=int, default=None, help="Gleichzeitig aktive Läufe (= Worker-Threads)")
+    args = parser.parse_args()
+
+    config = Config()
+    api = WorkflowAPI(config, max_concurrent_runs=args.max_concurrent_runs)
+    web.run_app(api.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
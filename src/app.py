@@ -3,11 +3,17 @@ Streamlit Main Application
 """
 
 import streamlit as st
+import hashlib
 import json
 from config import Config
 from workflow import WorkflowProcessor
 from prompt_discovery import PromptDiscovery
+from json_repair import JSONRepairError, parse_json_text
 from models import AVAILABLE_MODELS
+from run_store import RunStore
+from token_budget import calibration, truncated_steps
+from prefetch import Prefetcher
+from concurrent.futures import ThreadPoolExecutor
 
 # Page Config
 st.set_page_config(
@@ -65,22 +71,56 @@ st.markdown("""
 def get_core_components():
     config = Config()
     processor = WorkflowProcessor(config)
-    discovery = PromptDiscovery(config.PROMPT_DIR, config.langfuse)
+    discovery = PromptDiscovery(config.PROMPT_DIR)
     return config, processor, discovery
 
 config, processor, discovery = get_core_components()
 
+@st.cache_resource
+def get_run_store():
+    return RunStore(config.RUN_DB_PATH)
+
+run_store = get_run_store()
+
+@st.cache_resource
+def get_prefetch_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
 # --- Session State ---
-if "workflow_data" not in st.session_state:
-    st.session_state.workflow_data = {}
+# Ergebnisse liegen im Run Store, die Session hält nur die Run-ID
+if "run_id" not in st.session_state:
+    st.session_state.run_id = None
+# Scraping/Parsing starten, sobald URL bzw. Anhänge da sind (nicht erst beim Start)
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = Prefetcher(get_prefetch_executor(), processor.scraper, processor.document_parser)
+
+# Ergebnis-Ansichten: Blobs sind inhaltsadressiert (SHA-256), daher sind Hash-Keys
+# stabil über Reruns und Läufe hinweg; teures Rendern/Serialisieren passiert einmal
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_blob(blob_hash):
+    """Lädt ein einzelnes Schritt-Ergebnis aus dem Run Store (lazy pro Ansicht)"""
+    return run_store.get_blob(blob_hash)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def parsed_blob(blob_hash):
+    return try_parse_json(load_blob(blob_hash))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def concept_html(blob_hash):
+    c_json = parsed_blob(blob_hash)
+    return render_json_html(c_json) if c_json else None
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def download_payload(blob_hash):
+    content = load_blob(blob_hash)
+    return content if isinstance(content, str) else json.dumps(content, indent=2, ensure_ascii=False)
 
 # --- Helper Functions ---
 def try_parse_json(content):
     if isinstance(content, dict): return content
     try:
-        clean = content.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean)
-    except: return None
+        return parse_json_text(content)[0]
+    except JSONRepairError: return None
 
 def render_json_html(data):
     if not isinstance(data, dict): return f"<div>{data}</div>"
@@ -166,6 +206,36 @@ def render_article_dashboard(article_json):
         else:
             st.caption("Keine Abweichungen.")
 
+def describe_files(uploaded_files):
+    """Dateinamen, Größe und Hash der Anhänge für den Run Store"""
+    files = []
+    for f in uploaded_files or []:
+        data = f.getvalue()
+        files.append({"name": f.name, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+    return files
+
+def run_label(url_input, text_input, results=None):
+    """Kurzer Titel für die Verlaufsliste"""
+    if results:
+        headline = (results.get("scraped_data") or {}).get("metadata", {}).get("headline")
+        if headline: return headline
+        article = results.get("article")
+        if isinstance(article, dict):
+            headline = article.get("online", {}).get("ueberschrift")
+            if headline: return headline
+    if url_input: return url_input
+    first_line = (text_input or "").strip().split("\n")[0]
+    return first_line[:80] or "Ohne Titel"
+
+def format_run_option(run_id):
+    run = runs_by_id.get(run_id)
+    if not run: return run_id
+    tokens = sum((u or {}).get("total") or 0 for u in run["usage"].values())
+    return f"{run['created_at'].replace('T', ' ')} · {run['label'] or 'Ohne Titel'} ({tokens} Tokens)"
+
+def select_history_run():
+    st.session_state.run_id = st.session_state.history_choice
+
 def get_index_for_default(options, search_strings):
     if not isinstance(search_strings, list): search_strings = [search_strings]
     for search in search_strings:
@@ -206,6 +276,8 @@ with st.sidebar:
     
     st.subheader("Prompts")
     available = discovery.list_available_prompts()
+    if discovery.langfuse_pending:
+        st.caption("⏳ Langfuse-Prompts werden im Hintergrund geladen...")
     
     opts_extract = [f"{p['display_name']} ({p['source']})" for p in available["extraction"]]
     opts_draft = [f"{p['display_name']} ({p['source']})" for p in available["draft"]]
@@ -229,6 +301,45 @@ with st.sidebar:
     p4_sel = st.selectbox("4. Fakten-Check", opts_check, index=idx_c)
     p4_ver = st.selectbox("Version", get_versions(p4_sel), key="v4")
 
+    opts_fix = [f"{p['display_name']} ({p['source']})" for p in available["fix"]]
+    p5_sel, p5_ver = None, None
+    if opts_fix:
+        idx_f = get_index_for_default(opts_fix, ["fix", "korrektur"])
+        p5_sel = st.selectbox("5. Korrektur", opts_fix, index=idx_f)
+        p5_ver = st.selectbox("Version", get_versions(p5_sel), key="v5")
+    max_fix_iterations = st.slider("Max. Korrekturrunden", 0, 3, 1, disabled=not opts_fix)
+
+    st.divider()
+
+    st.subheader("🔬 Profiling")
+    profile_mode = None
+    if st.toggle("Lauf profilen", value=False, help="Zeichnet auf, wo die Zeit eines Laufs verbracht wird (Flame Graph für speedscope.app)"):
+        profile_mode = st.radio(
+            "Modus", ["sampling", "deterministic"], horizontal=True,
+            format_func=lambda m: {"sampling": "Sampling (leicht)", "deterministic": "Deterministisch (exakt, langsamer)"}[m]
+        )
+
+    st.divider()
+
+    st.subheader("📚 Verlauf")
+    past_runs = [r for r in run_store.list_runs(limit=50) if r["status"] == "complete"]
+    runs_by_id = {r["id"]: r for r in past_runs}
+    if past_runs:
+        run_ids = list(runs_by_id)
+        current = st.session_state.run_id
+        st.selectbox(
+            "Frühere Läufe",
+            run_ids,
+            index=run_ids.index(current) if current in runs_by_id else 0,
+            format_func=format_run_option,
+            key="history_choice",
+            on_change=select_history_run
+        )
+        if st.button("Lauf öffnen", use_container_width=True):
+            select_history_run()
+    else:
+        st.caption("Noch keine gespeicherten Läufe.")
+
 
 # =========================================================
 # MAIN CONTENT
@@ -247,24 +358,20 @@ with col2:
     st.info(f"Modell: {model_choice} | Datum: {processor.get_date_string()}")
     start_btn = st.button("🚀 Workflow starten", type="primary", use_container_width=True)
 
+st.session_state.prefetcher.update(url_input, uploaded_files)
+
 st.divider()
 status_container = st.status("Bereit...", expanded=False)
 
-tab1, tab2, tab3, tab4 = st.tabs([
-    "📊 1. Daten (JSON)", 
-    "💡 2. Konzept (Tabelle)", 
-    "📰 3. Artikel (Preview)", 
-    "✅ 4. Check (Report)"
-])
-
 if start_btn:
-    st.session_state.workflow_data = {}
+    st.session_state.run_id = None
     processor.logger.clear()
     status_container.update(label="🚀 Workflow läuft...", state="running", expanded=True)
     
     def update_status(msg):
         status_container.write(msg)
 
+    run_id = None
     try:
         configs = {
             "extract": {"name": parse_selection(p1_sel)[0], "source": parse_selection(p1_sel)[1], "version": p1_ver},
@@ -272,6 +379,19 @@ if start_btn:
             "write":   {"name": parse_selection(p3_sel)[0], "source": parse_selection(p3_sel)[1], "version": p3_ver},
             "check":   {"name": parse_selection(p4_sel)[0], "source": parse_selection(p4_sel)[1], "version": p4_ver}
         }
+        if p5_sel:
+            configs["fix"] = {"name": parse_selection(p5_sel)[0], "source": parse_selection(p5_sel)[1], "version": p5_ver}
+
+        run_id = run_store.create_run(
+            inputs={"url": url_input, "meta": meta_input, "text": text_input, "files": describe_files(uploaded_files)},
+            prompt_configs=configs,
+            model_settings=model_settings,
+            label=run_label(url_input, text_input),
+            prompt_texts=processor.resolve_prompts(configs)
+        )
+
+        # Im Hintergrund bereits gescrapt/geparst? (wartet ggf. auf laufenden Prefetch)
+        prefetched = st.session_state.prefetcher.collect(url_input, uploaded_files)
         
         # Aufruf des neuen Master-Workflows
         results = processor.run_workflow(
@@ -281,13 +401,20 @@ if start_btn:
             url_input=url_input,   # <--- URL übergeben
             prompt_configs=configs, 
             model_settings=model_settings,
-            status_callback=update_status
+            status_callback=update_status,
+            max_fix_iterations=max_fix_iterations,
+            profile=profile_mode,
+            **prefetched
         )
         
-        st.session_state.workflow_data = results
+        run_store.save_results(run_id, results)
+        run_store.update_label(run_id, run_label(url_input, text_input, results))
+        st.session_state.run_id = run_id
         status_container.update(label="✅ Fertig!", state="complete", expanded=False)
 
     except Exception as e:
+        if run_id:
+            run_store.finish_run(run_id, status="error", error=str(e))
         status_container.update(label="❌ Fehler", state="error")
         st.error(f"Fehler im Ablauf: {str(e)}")
         import traceback
@@ -297,56 +424,95 @@ if start_btn:
         processor.flush_stats()
 
 # --- OUTPUT VIEW ---
-if "workflow_data" in st.session_state and st.session_state.workflow_data:
-    d = st.session_state.workflow_data
-    
-    with tab1:
-        if "json" in d: st.json(d["json"], expanded=True)
+RESULT_VIEWS = ["📊 1. Daten (JSON)", "💡 2. Konzept (Tabelle)", "📰 3. Artikel (Preview)", "✅ 4. Check (Report)"]
+
+if st.session_state.run_id:
+    run_id = st.session_state.run_id
+    run_meta = run_store.get_run(run_id)
+    step_hashes = {step: info["hash"] for step, info in (run_meta or {}).get("steps", {}).items()}
+
+    # Nur die gewählte Ansicht wird gerendert (st.tabs rendert bei jedem Rerun alle)
+    view = st.segmented_control("Ansicht", RESULT_VIEWS, default=RESULT_VIEWS[0], key="result_view", label_visibility="collapsed") or RESULT_VIEWS[0]
+
+    if view == RESULT_VIEWS[0]:
+        if "json" in step_hashes: st.json(load_blob(step_hashes["json"]), expanded=True)
         else: st.info("Warte auf Daten...")
 
-    with tab2:
-        if "concept" in d:
-            c_json = try_parse_json(d["concept"])
-            if c_json: st.markdown(render_json_html(c_json), unsafe_allow_html=True)
-            else: st.markdown(d["concept"])
+    elif view == RESULT_VIEWS[1]:
+        if "concept" in step_hashes:
+            html = concept_html(step_hashes["concept"])
+            if html: st.markdown(html, unsafe_allow_html=True)
+            else: st.markdown(load_blob(step_hashes["concept"]))
         else: st.info("Warte auf Konzept...")
 
-    with tab3:
-        if "article" in d:
-            a_data = d["article"]
-            if isinstance(a_data, str):
-                a_data = try_parse_json(a_data)
-            
+    elif view == RESULT_VIEWS[2]:
+        if "article" in step_hashes:
+            a_data = parsed_blob(step_hashes["article"])
             if isinstance(a_data, dict):
                 render_article_dashboard(a_data)
                 st.divider()
-                with st.expander("🔍 Rohes JSON ansehen"):
+                if st.toggle("🔍 Rohes JSON ansehen", key="show_raw_article"):
                     st.json(a_data)
             else:
                 st.warning("⚠️ Text-Format (kein JSON):")
-                st.markdown(d["article"])
+                st.markdown(load_blob(step_hashes["article"]))
         else: st.info("Warte auf Artikel...")
 
-    with tab4:
-        if "check" in d: st.markdown(d["check"])
+    else:
+        if "check" in step_hashes: st.markdown(load_blob(step_hashes["check"]))
         else: st.info("Warte auf Check...")
 
+        if "fix_history" in step_hashes:
+            fix_history = load_blob(step_hashes["fix_history"])
+            with st.expander(f"🩹 Korrekturen ({len(fix_history)} Runde(n))"):
+                for entry in fix_history:
+                    st.markdown(f"**Runde {entry['iteration']}:** {entry.get('status_before', '?')} → {entry.get('status_after', '?')} "
+                                f"· geändert: {', '.join(entry['geaenderte_abschnitte']) or '–'}")
+                    for k in entry["korrekturen"]:
+                        st.markdown(f"- {k.get('fehler')}: ~~{k.get('vorher')}~~ → {k.get('nachher')}")
+                    for n in entry["nicht_korrigiert"]:
+                        st.caption(f"Nicht korrigiert: {n}")
+                if "check_initial" in step_hashes:
+                    st.markdown("---\n**Ursprünglicher Check:**")
+                    st.markdown(load_blob(step_hashes["check_initial"]))
+
     st.divider()
     with st.expander("💾 Ergebnisse herunterladen", expanded=True):
-        c1, c2, c3, c4 = st.columns(4)
-        
-        if "json" in d:
-            c1.download_button("📥 1. Daten (JSON)", json.dumps(d["json"], indent=2, ensure_ascii=False), "data.json", "application/json")
-        
-        if "concept" in d:
-            c_content = d["concept"]
-            if isinstance(c_content, dict): c_content = json.dumps(c_content, indent=2, ensure_ascii=False)
-            c2.download_button("📥 2. Konzept (JSON)", c_content, "concept.json", "application/json")
-            
-        if "article" in d:
-            a_content = d["article"]
-            if isinstance(a_content, dict): a_content = json.dumps(a_content, indent=2, ensure_ascii=False)
-            c3.download_button("📥 3. Artikel (JSON)", a_content, "article.json", "application/json")
-            
-        if "check" in d:
-            c4.download_button("📥 4. Check (MD)", d["check"], "check_report.md", "text/markdown")
+        # Payloads erst beim Klick erzeugen (Callable), memoisiert pro Blob-Hash
+        downloads = [
+            ("json", "📥 1. Daten (JSON)", "data.json", "application/json"),
+            ("concept", "📥 2. Konzept (JSON)", "concept.json", "application/json"),
+            ("article", "📥 3. Artikel (JSON)", "article.json", "application/json"),
+            ("check", "📥 4. Check (MD)", "check_report.md", "text/markdown"),
+        ]
+        for col, (step, label, file_name, mime) in zip(st.columns(4), downloads):
+            if step in step_hashes:
+                col.download_button(label, lambda h=step_hashes[step]: download_payload(h), file_name, mime, on_click="ignore")
+
+        if run_meta and (run_meta["timings"] or run_meta["usage"]):
+            st.caption("⏱ " + " | ".join(f"{k}: {v:.1f}s" for k, v in run_meta["timings"].items()))
+            total_tokens = sum((u or {}).get("total") or 0 for u in run_meta["usage"].values())
+            ratio = calibration(run_meta["usage"])
+            st.caption(f"🔢 Tokens gesamt: {total_tokens}" + (f" | Schätzung Input: Faktor {ratio} (tatsächlich/geschätzt)" if ratio else ""))
+            truncated = truncated_steps(run_meta["usage"])
+            if truncated:
+                st.caption(f"✂️ Am Output-Limit abgeschnitten: {', '.join(truncated)}")
+            payload_stats = load_blob(step_hashes["payload_stats"]) if "payload_stats" in step_hashes else None
+            if payload_stats:
+                before = sum(p["before"] for p in payload_stats.values())
+                after = sum(p["after"] for p in payload_stats.values())
+                details = ", ".join(f"{k} -{p['saved_pct']:.0f}%" for k, p in payload_stats.items())
+                st.caption(f"📉 Inter-Step-Payloads: ~{before} → ~{after} Tokens ({details})")
+
+    if "profile" in step_hashes:
+        with st.expander("🔬 Profil dieses Laufs"):
+            profile = load_blob(step_hashes["profile"])
+            st.caption(f"Modus: {profile['mode']} · Dauer: {profile['duration_s']:.2f}s" + (" · gekürzt (Event-Limit)" if profile.get("truncated") else ""))
+            st.markdown("**Schritte (Wall-Clock)**")
+            st.dataframe([{"Schritt": s["name"], "Dauer (s)": round(s["end_s"] - s["start_s"], 3), "Start (s)": s["start_s"]} for s in profile["spans"]], hide_index=True)
+            st.markdown("**Teuerste Funktionen (Self-Zeit)**")
+            st.dataframe(profile["top"], hide_index=True)
+            if "profile_speedscope" in step_hashes:
+                st.download_button("📥 Flame Graph (speedscope JSON)", lambda h=step_hashes["profile_speedscope"]: download_payload(h),
+                                   f"profile_{run_id[:8]}.speedscope.json", "application/json", on_click="ignore")
+                st.caption("Öffnen mit https://www.speedscope.app")
@@ -0,0 +1,441 @@
+"""
+Bulk Modul
+Offline-Massenverarbeitung (z.B. Archiv-Nachbearbeitung über Nacht) über die Batch-API
+des LLM-Backends statt einzelner synchroner Requests.
+
+Alle Items durchlaufen die Pipeline stufenweise: Extract-Batch -> Draft-Batch ->
+Write-Batch -> Check-Batch. Eine Stufe wird erst eingereicht, wenn die vorherige für
+alle Items abgeschlossen ist (möglichst große Jobs). Identische Requests werden nur
+einmal eingereicht. Der Zustand liegt im State-Verzeichnis; ein abgebrochener Lauf
+wird mit demselben Aufruf fortgesetzt.
+
+Start: python src/bulk.py --input items.jsonl --state-dir data/bulk/archiv
+
+items.jsonl (eine Meldung pro Zeile, Dateipfade relativ zur JSONL-Datei):
+    {"id": "pm-1", "url": "https://www.presseportal.de/...", "meta": "...", "text": "...", "files": ["a.pdf"]}
+
+State-Verzeichnis:
+    manifest.json        Einstellungen, eingereichte Jobs
+    items/<id>.json      Stufe, Versuche und Ergebnisse pro Item
+    results.jsonl        Export nach Abschluss
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from document_parser import NamedBytesIO
+from json_repair import JSONRepairError, parse_json_text
+from llm_backend import BATCH_PENDING_STATES, request_key
+from prompt_schema import restore_dynamic_keys_for_prompt
+from token_budget import TokenBudgetError
+from workflow import JSON_STEP_ATTEMPTS, usage_entry
+
+STAGES = ("extract", "draft", "write", "check")
+# Aufrufnamen wie im synchronen Workflow (Output-Limits, Usage-Keys)
+STEP_NAMES = {
+    "extract": "gemini-extraction",
+    "draft": "gemini-draft-concept",
+    "write": "gemini-write-article",
+    "check": "gemini-final-check",
+}
+# Ergebnis-Keys wie in run_workflow
+RESULT_KEYS = {"extract": "json", "draft": "concept", "write": "article", "check": "check"}
+
+BULK_PROMPT_CONFIGS = {
+    "extract": {"name": "prompt_extract", "source": "file", "version": "latest"},
+    "draft":   {"name": "prompt_draft", "source": "file", "version": "latest"},
+    "write":   {"name": "prompt_write", "source": "file", "version": "latest"},
+    "check":   {"name": "prompt_check", "source": "file", "version": "latest"}
+}
+
+# Inline-Batches sind auf ~20 MB pro Job begrenzt
+BATCH_MAX_REQUESTS = 1000
+BATCH_MAX_BYTES = 18 * 1024 * 1024
+POLL_INTERVAL_S = 30
+# Wie oft ein Item nach fehlgeschlagenem Job / API-Fehler neu eingereicht wird
+BULK_MAX_ATTEMPTS = 3
+
+
+def _write_json(path, data):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+class BulkRunner:
+
+    def __init__(self, processor, state_dir, prompt_configs=None, model_settings=None,
+                 batch_max_requests=BATCH_MAX_REQUESTS, batch_max_bytes=BATCH_MAX_BYTES, poll_interval_s=POLL_INTERVAL_S):
+        self.processor = processor
+        self.backend = processor.config.backend
+        self.logger = processor.logger
+        self.state_dir = Path(state_dir)
+        self.items_dir = self.state_dir / "items"
+        self.items_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.state_dir / "manifest.json"
+        self.batch_max_requests = batch_max_requests
+        self.batch_max_bytes = batch_max_bytes
+        self.poll_interval_s = poll_interval_s
+
+        if self.manifest_path.exists():
+            # Fortsetzen: Einstellungen des ursprünglichen Laufs gelten weiter
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        else:
+            settings = dict(model_settings or {"temp": 0.1})
+            settings["model"] = settings.get("model") or processor.config.MODEL_NAME
+            self.manifest = {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "prompt_configs": prompt_configs or BULK_PROMPT_CONFIGS,
+                "model_settings": settings,
+                "jobs": [],
+                "stats": {"requests": 0, "deduplicated": 0},
+            }
+            self._save_manifest()
+        self._system_prompts = {}
+
+    # ------------------------------------------------------------
+    # Zustand
+    # ------------------------------------------------------------
+
+    def _save_manifest(self):
+        _write_json(self.manifest_path, self.manifest)
+
+    def _item_path(self, item_id):
+        safe = re.sub(r"[^\w.-]", "_", str(item_id))[:120]
+        return self.items_dir / f"{safe}.json"
+
+    def _save_item(self, item):
+        _write_json(self._item_path(item["id"]), item)
+
+    def items(self):
+        return [json.loads(p.read_text(encoding="utf-8")) for p in sorted(self.items_dir.glob("*.json"))]
+
+    def add_items(self, input_path):
+        """Liest die Eingabe; bereits bekannte Items (Fortsetzen) bleiben unverändert"""
+        input_path = Path(input_path)
+        added = 0
+        with open(input_path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                spec = json.loads(line)
+                item_id = str(spec.get("id") or line_no)
+                if self._item_path(item_id).exists():
+                    continue
+                spec["files"] = [str((input_path.parent / p).resolve()) for p in spec.get("files") or []]
+                self._save_item({
+                    "id": item_id, "input": spec, "stage": STAGES[0], "status": "new",
+                    "attempts": {}, "results": {"usage": {}}, "error": None
+                })
+                added += 1
+        return added
+
+    # ------------------------------------------------------------
+    # Vorbereitung (Scraping / Parsing, lokal parallel)
+    # ------------------------------------------------------------
+
+    def _prepare(self, item):
+        spec = item["input"]
+        extract_config = self.manifest["prompt_configs"]["extract"]
+        try:
+            scraped_text = ""
+            url = spec.get("url") or ""
+            if "presseportal" in url:
+                scraped_data = self.processor.scraper.scrape(url)
+                if "error" not in scraped_data:
+                    item["results"]["scraped_data"] = scraped_data
+                scraped_text = self.processor.scrape_section(url, scraped_data)
+            files = [NamedBytesIO(Path(p).name, Path(p).read_bytes()) for p in spec.get("files") or []]
+            file_content = self.processor.document_parser.parse_uploaded_files(files)
+            raw, trimmed = self.processor.compose_raw_input(
+                scraped_text, spec.get("meta", ""), spec.get("text", ""), file_content, extract_config, self.manifest["model_settings"]
+            )
+            item["results"]["raw"] = raw
+            if trimmed:
+                item["results"]["input_trimmed"] = trimmed
+            item["status"] = "pending"
+        except Exception as e:
+            item["status"], item["error"] = "failed", f"Vorbereitung: {e}"
+        self._save_item(item)
+        return item
+
+    def prepare_all(self, max_workers=8):
+        new_items = [i for i in self.items() if i["status"] == "new"]
+        if new_items:
+            self.logger.info(f"📎 Bereite {len(new_items)} Items vor (Scraping/Parsing)...")
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(self._prepare, new_items))
+
+    # ------------------------------------------------------------
+    # Requests pro Stufe
+    # ------------------------------------------------------------
+
+    def _system_prompt(self, stage):
+        if stage not in self._system_prompts:
+            config = self.manifest["prompt_configs"][stage]
+            self._system_prompts[stage] = self.processor.prompt_manager.load_prompt_by_config(config)
+        return self._system_prompts[stage]
+
+    def _user_message(self, stage, results):
+        p = self.processor
+        if stage == "extract":
+            return results["raw"]
+        if stage == "draft":
+            return p.draft_message(results["json"])
+        if stage == "write":
+            return p.write_message(results["json"], results["concept"])
+        return p.check_message(p.article_for_check(results["article"]), results["json"], results["raw"])
+
+    def build_request(self, item, stage):
+        """Request im Batch-Format (wie generate()), plus Token-Plan für die Usage"""
+        prepared = self.processor.prepare_request(
+            self._system_prompt(stage), self._user_message(stage, item["results"]),
+            stage != "check", self.manifest["model_settings"], STEP_NAMES[stage]
+        )
+        request = {
+            "user_content": prepared["user_input"],
+            "system_instruction": prepared["system_prompt"],
+            "temperature": prepared["settings"].get("temp", 0.1),
+            "max_output_tokens": prepared["plan"]["max_output_tokens"],
+            "json_mode": prepared["json_mode"],
+            "response_schema": prepared["response_schema"],
+        }
+        request["key"] = request_key(
+            prepared["model_name"], request["user_content"], request["system_instruction"],
+            request["temperature"], request["max_output_tokens"], request["json_mode"]
+        )
+        return request, prepared["plan"]
+
+    def _chunks(self, requests):
+        chunk, size = [], 0
+        for request in requests:
+            request_size = len(json.dumps(request, ensure_ascii=False).encode("utf-8"))
+            if chunk and (len(chunk) >= self.batch_max_requests or size + request_size > self.batch_max_bytes):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(request)
+            size += request_size
+        if chunk:
+            yield chunk
+
+    def submit_stage(self, stage):
+        pending = [i for i in self.items() if i["status"] == "pending" and i["stage"] == stage]
+        by_key, requests = {}, []
+        for item in pending:
+            try:
+                request, plan = self.build_request(item, stage)
+            except TokenBudgetError as e:
+                item["status"], item["error"] = "failed", str(e)
+                self._save_item(item)
+                continue
+            item["request"] = {"key": request["key"], "plan": plan}
+            if request["key"] not in by_key:
+                requests.append(request)
+            by_key.setdefault(request["key"], []).append(item)
+
+        model = self.manifest["model_settings"]["model"]
+        for number, chunk in enumerate(self._chunks(requests), 1):
+            job_name = self.backend.batch_submit(model, chunk, display_name=f"klt-bulk-{stage}-{number}")
+            item_ids = {r["key"]: [i["id"] for i in by_key[r["key"]]] for r in chunk}
+            self.manifest["jobs"].append({
+                "name": job_name, "stage": stage, "items": item_ids,
+                "submitted_at": datetime.now().isoformat(timespec="seconds"), "state": "pending", "collected": False
+            })
+            self.manifest["stats"]["requests"] += len(chunk)
+            self.manifest["stats"]["deduplicated"] += sum(len(ids) for ids in item_ids.values()) - len(chunk)
+            # Erst den Job sichern, dann die Items darauf zeigen lassen (Abbruch dazwischen -> _recover)
+            self._save_manifest()
+            for request in chunk:
+                for item in by_key[request["key"]]:
+                    item["status"], item["job"] = "submitted", job_name
+                    self._save_item(item)
+            self.logger.info(f"📦 {stage}: Job {job_name} mit {len(chunk)} Requests eingereicht")
+
+    def _recover(self):
+        """Items, deren Job nie im Manifest gelandet ist (Abbruch/Fehler beim Einreichen), neu einreichen"""
+        known = {job["name"] for job in self.manifest["jobs"]}
+        for item in self.items():
+            if item["status"] == "submitted" and item.get("job") not in known:
+                item["status"] = "pending"
+                item.pop("job", None)
+                self._save_item(item)
+
+    # ------------------------------------------------------------
+    # Ergebnisse einsammeln
+    # ------------------------------------------------------------
+
+    def _retry_or_fail(self, item, stage, error):
+        attempts = item["attempts"].get(stage, 0) + 1
+        item["attempts"][stage] = attempts
+        if attempts >= BULK_MAX_ATTEMPTS:
+            item["status"], item["error"] = "failed", f"{stage}: {error}"
+        else:
+            item["status"] = "pending"
+
+    def _apply(self, item, stage, response):
+        name = STEP_NAMES[stage]
+        plan = (item.get("request") or {}).get("plan")
+        item["results"]["usage"][name] = usage_entry(self.manifest["model_settings"]["model"], response, plan)
+        # Request-Key pro Schritt: geteilte Requests in summary() nur einmal zählen
+        item.setdefault("request_keys", {})[name] = (item.get("request") or {}).get("key")
+        text = response.text or ""
+
+        if stage == "check":
+            value = text
+        else:
+            try:
+                value, _ = parse_json_text(text)
+                value = restore_dynamic_keys_for_prompt(value, self._system_prompt(stage))
+            except JSONRepairError as e:
+                # Wie im synchronen Workflow: Schritt wiederholen, zuletzt Notfall-Objekt
+                attempts = item["attempts"].get(f"{stage}_json", 0) + 1
+                item["attempts"][f"{stage}_json"] = attempts
+                if attempts < JSON_STEP_ATTEMPTS:
+                    self.logger.warning(f"{item['id']} {name}: {e} (Versuch {attempts}/{JSON_STEP_ATTEMPTS})")
+                    item["status"] = "pending"
+                    return
+                value = self.processor.json_error_stub(text)
+
+        item["results"][RESULT_KEYS[stage]] = value
+        next_index = STAGES.index(stage) + 1
+        if next_index < len(STAGES):
+            item["stage"], item["status"] = STAGES[next_index], "pending"
+        else:
+            item["stage"], item["status"] = "done", "done"
+
+    def collect(self, job):
+        """Holt einen fertigen Job ab; False, solange er noch läuft"""
+        state = self.backend.batch_status(job["name"])
+        job["state"] = state
+        if state in BATCH_PENDING_STATES:
+            return False
+
+        results = self.backend.batch_results(job["name"]) if state == "succeeded" else {}
+        for key, item_ids in job["items"].items():
+            response = results.get(key)
+            for item_id in item_ids:
+                item = json.loads(self._item_path(item_id).read_text(encoding="utf-8"))
+                if item.get("job") != job["name"]:
+                    continue
+                if response is None or isinstance(response, Exception):
+                    self._retry_or_fail(item, job["stage"], response or f"Job {state}")
+                else:
+                    self._apply(item, job["stage"], response)
+                item.pop("job", None)
+                self._save_item(item)
+
+        job["collected"] = True
+        self._save_manifest()
+        self.logger.info(f"📥 {job['stage']}: Job {job['name']} abgeholt ({state})")
+        return True
+
+    # ------------------------------------------------------------
+    # Ablauf
+    # ------------------------------------------------------------
+
+    def run(self):
+        """Bis alle Items fertig (oder endgültig fehlgeschlagen) sind; jederzeit fortsetzbar"""
+        self.prepare_all()
+        self._recover()
+        while True:
+            open_jobs = [j for j in self.manifest["jobs"] if not j["collected"]]
+            if open_jobs:
+                if not any([self.collect(job) for job in open_jobs]):
+                    time.sleep(self.poll_interval_s)
+                continue
+
+            items = self.items()
+            stage = next((s for s in STAGES if any(i["status"] == "pending" and i["stage"] == s for i in items)), None)
+            if stage is None:
+                break
+            self.submit_stage(stage)
+        return self.summary()
+
+    def summary(self):
+        items = self.items()
+        tokens, seen = 0, set()
+        for item in items:
+            keys = item.get("request_keys", {})
+            for name, usage in item["results"]["usage"].items():
+                key = keys.get(name)
+                if key:
+                    if (name, key) in seen:
+                        continue
+                    seen.add((name, key))
+                tokens += (usage or {}).get("total") or 0
+        return {
+            "items": len(items),
+            "done": sum(i["status"] == "done" for i in items),
+            "failed": sum(i["status"] == "failed" for i in items),
+            "jobs": len(self.manifest["jobs"]),
+            "requests": self.manifest["stats"]["requests"],
+            "deduplicated": self.manifest["stats"]["deduplicated"],
+            "tokens": tokens,
+        }
+
+    def export(self, output_path=None, run_store=None):
+        """Schreibt results.jsonl; optional jedes fertige Item als Lauf in den Run Store"""
+        output_path = Path(output_path or self.state_dir / "results.jsonl")
+        with open(output_path, "w", encoding="utf-8") as f:
+            for item in self.items():
+                f.write(json.dumps({"id": item["id"], "status": item["status"], "error": item["error"], **item["results"]}, ensure_ascii=False) + "\n")
+                if run_store and item["status"] == "done" and not item.get("run_id"):
+                    spec = item["input"]
+                    run_id = run_store.create_run(
+                        inputs={"url": spec.get("url"), "meta": spec.get("meta"), "text": spec.get("text"), "files": spec.get("files"), "bulk_id": item["id"]},
+                        prompt_configs=self.manifest["prompt_configs"],
+                        model_settings=self.manifest["model_settings"],
+                        label=f"[Bulk] {item['id']}",
+                        prompt_texts={stage: self._system_prompt(stage) for stage in STAGES}
+                    )
+                    run_store.save_results(run_id, item["results"])
+                    item["run_id"] = run_id
+                    self._save_item(item)
+        return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-Verarbeitung über die Batch-API (stufenweise, fortsetzbar)")
+    parser.add_argument("--input", help="items.jsonl (beim Fortsetzen optional)")
+    parser.add_argument("--state-dir", required=True)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--temp", type=float, default=0.1)
+    parser.add_argument("--prompts", help="JSON-Datei mit Prompt-Configs (extract/draft/write/check)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_REQUESTS, help="Max. Requests pro Batch-Job")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_S)
+    parser.add_argument("--save-runs", action="store_true", help="Fertige Items zusätzlich im Run Store ablegen")
+    args = parser.parse_args()
+
+    from config import Config
+    from workflow import WorkflowProcessor
+
+    config = Config()
+    processor = WorkflowProcessor(config)
+    prompt_configs = json.loads(Path(args.prompts).read_text(encoding="utf-8")) if args.prompts else None
+    runner = BulkRunner(
+        processor, args.state_dir, prompt_configs=prompt_configs,
+        model_settings={"model": args.model, "temp": args.temp},
+        batch_max_requests=args.batch_size, poll_interval_s=args.poll_interval
+    )
+    if args.input:
+        added = runner.add_items(args.input)
+        processor.logger.info(f"➕ {added} neue Items aus {args.input}")
+
+    summary = runner.run()
+    run_store = None
+    if args.save_runs:
+        from run_store import RunStore
+        run_store = RunStore(config.RUN_DB_PATH)
+    output = runner.export(run_store=run_store)
+    print(json.dumps(summary, ensure_ascii=False))
+    print(f"Ergebnisse: {output}")
+    return 0 if summary["done"] == summary["items"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
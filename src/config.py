@@ -2,13 +2,18 @@
 Konfigurationsmodul
 """
 import os
+import threading
 import streamlit as st
 from pathlib import Path
-from google import genai
-from google.genai import types
 
 # --- NEU: Import ---
 from models import DEFAULT_MODEL 
+from llm_backend import create_backend
+from context_cache import ContextCacheRegistry
+from token_budget import TokenBudget
+
+# Wie lange ein Lauf höchstens auf den Langfuse Auth-Check im Hintergrund wartet
+LANGFUSE_AUTH_TIMEOUT_S = 10
 
 class Config:
     def __init__(self):
@@ -16,6 +21,8 @@ class Config:
         self.BASE_DIR = Path(__file__).parent.parent
         self.PROMPT_DIR = self.BASE_DIR / "prompts"
         self.PROMPT_DIR.mkdir(parents=True, exist_ok=True)
+        self.DATA_DIR = Path(self._get_secret("KLT_DATA_DIR") or self.BASE_DIR / "data")
+        self.RUN_DB_PATH = self.DATA_DIR / "runs.sqlite3"
         
         # --- NEU: Nutzung der Konstante ---
         self.MODEL_NAME = DEFAULT_MODEL
@@ -23,57 +30,131 @@ class Config:
         # API Keys
         self.api_key = self._get_secret("GEMINI_API_KEY") or self._get_secret("GOOGLE_API_KEY")
         
-        self.client = None
-        if self.api_key:
-            self.client = genai.Client(api_key=self.api_key)
+        # Gemini Client wird erst beim ersten Request erzeugt (google.genai Import ist teuer)
+        self._client = None
+        self._client_key = None
+        self._client_lock = threading.Lock()
+
+        # LLM Backend: gemini (Standard) | record | replay | fake
+        self.backend = create_backend(self._get_secret("LLM_BACKEND"), self)
+
+        # Pre-Flight Token-Budget (Kontextlimits, Output-Limits pro Schritt, Kürzen des Roh-Inputs)
+        self.token_budget = TokenBudget(self)
+
+        # Opt-in: System-Prompts als Gemini Cached Content wiederverwenden
+        self.context_cache = None
+        if str(self._get_secret("GEMINI_CONTEXT_CACHE") or "").lower() in ("1", "true", "yes"):
+            self.context_cache = ContextCacheRegistry(
+                self.backend,
+                ttl_seconds=int(self._get_secret("GEMINI_CONTEXT_CACHE_TTL") or 3600),
+                min_chars=int(self._get_secret("GEMINI_CONTEXT_CACHE_MIN_CHARS") or 4096),
+                registry_path=self.DATA_DIR / "context_cache.json"
+            )
+
+        # Response-Schemas aus den Prompt-Templates an das Modell übergeben (abschaltbar)
+        self.use_response_schema = str(self._get_secret("GEMINI_RESPONSE_SCHEMA") or "1").lower() not in ("0", "false", "no")
         
-        self.enable_langfuse = self._setup_langfuse()
+        # Langfuse Auth-Check läuft im Hintergrund, das Ergebnis wird gecacht
+        self._langfuse_enabled = False
+        self._langfuse_ready = threading.Event()
+        self._setup_langfuse()
+
+    @property
+    def client(self):
+        if not self.api_key:
+            return None
+        with self._client_lock:
+            # api_key kann in der UI nachträglich gesetzt werden
+            if self._client is None or self._client_key != self.api_key:
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+                self._client_key = self.api_key
+            return self._client
+
+    @property
+    def enable_langfuse(self):
+        """Blockiert nur, solange der Auth-Check noch läuft (max. LANGFUSE_AUTH_TIMEOUT_S)"""
+        self._langfuse_ready.wait(LANGFUSE_AUTH_TIMEOUT_S)
+        return self._langfuse_enabled
+
+    @property
+    def langfuse_pending(self):
+        return not self._langfuse_ready.is_set()
 
     # ... (Rest der Datei bleibt exakt gleich: _get_secret, _setup_langfuse, generate_content)
     def _get_secret(self, key):
-        if key in st.secrets:
-            return st.secrets[key]
+        try:
+            if key in st.secrets:
+                return st.secrets[key]
+        except Exception:
+            # Keine secrets.toml (z.B. API-Server / CLI ausserhalb von Streamlit)
+            pass
         return os.environ.get(key)
 
     def _setup_langfuse(self):
+        pk = self._get_secret("LANGFUSE_PUBLIC_KEY")
+        sk = self._get_secret("LANGFUSE_SECRET_KEY")
+        host = self._get_secret("LANGFUSE_HOST") or self._get_secret("LANGFUSE_BASE_URL")
+
+        if not (pk and sk and host):
+            self._langfuse_ready.set()
+            return
+        os.environ["LANGFUSE_PUBLIC_KEY"] = pk
+        os.environ["LANGFUSE_SECRET_KEY"] = sk
+        os.environ["LANGFUSE_HOST"] = host
+        threading.Thread(target=self._check_langfuse_auth, name="langfuse-auth", daemon=True).start()
+
+    def _check_langfuse_auth(self):
         try:
-            pk = self._get_secret("LANGFUSE_PUBLIC_KEY")
-            sk = self._get_secret("LANGFUSE_SECRET_KEY")
-            host = self._get_secret("LANGFUSE_HOST") or self._get_secret("LANGFUSE_BASE_URL")
-            
-            if pk and sk and host:
-                os.environ["LANGFUSE_PUBLIC_KEY"] = pk
-                os.environ["LANGFUSE_SECRET_KEY"] = sk
-                os.environ["LANGFUSE_HOST"] = host
-                from langfuse import Langfuse
-                self.langfuse = Langfuse()
-                if self.langfuse.auth_check():
-                    return True
-                else:
-                    self.langfuse = None
-                    return False
-            return False
-        except Exception:
-            self.langfuse = None
-            return False
+            from langfuse import Langfuse
+            client = Langfuse()
+            if client.auth_check():
+                self.langfuse = client
+                self._langfuse_enabled = True
+        except Exception as e:
+            print(f"Langfuse Auth Fehler: {e}")
+        finally:
+            self._langfuse_ready.set()
 
-    def generate_content(self, user_content, system_instruction=None, model_name=None, temperature=0.1, json_mode=False):
-        if not self.client:
-            raise ValueError("API Key fehlt!")
-            
+    def generate_content(self, user_content, system_instruction=None, model_name=None, temperature=0.1, json_mode=False, response_schema=None, max_output_tokens=8192):
         # Fallback auf Default aus models.py
         target_model = model_name if model_name else self.MODEL_NAME
-        
-        config = types.GenerateContentConfig(
-            temperature=temperature,
-            max_output_tokens=8192,
-            system_instruction=system_instruction
-        )
-        if json_mode:
-            config.response_mime_type = "application/json"
-            
-        return self.client.models.generate_content(
+
+        cached_content = None
+        if self.context_cache:
+            cached_content = self.context_cache.get_or_create(target_model, system_instruction)
+
+        request = dict(
             model=target_model,
-            contents=user_content,
-            config=config
+            user_content=user_content,
+            system_instruction=system_instruction,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            json_mode=json_mode
         )
+        if json_mode and response_schema and self.use_response_schema:
+            request["response_schema"] = response_schema
+
+        try:
+            return self._generate_with_cache(request, cached_content)
+        except Exception as e:
+            # Schema vom Modell abgelehnt (z.B. zu komplex) -> ohne Schema, JSON-Modus bleibt
+            if "response_schema" not in request or not ("INVALID_ARGUMENT" in str(e) or "schema" in str(e).lower()):
+                raise
+            print(f"Response-Schema abgelehnt, ohne Schema wiederholen: {e}")
+            request.pop("response_schema")
+            return self._generate_with_cache(request, cached_content)
+
+    def _generate_with_cache(self, request, cached_content):
+        if not cached_content:
+            return self.backend.generate(**request)
+
+        try:
+            return self.backend.generate(cached_content=cached_content, **request)
+        except Exception as e:
+            # Nur wenn der Cache serverseitig weg/abgelaufen ist: Handle verwerfen, ohne Cache wiederholen
+            if not any(marker in str(e) for marker in ("NOT_FOUND", "404", "PERMISSION_DENIED", "expired")):
+                raise
+            print(f"Cached Content Fehler, ohne Cache wiederholen: {e}")
+            self.context_cache.invalidate(request["model"], request["system_instruction"])
+            return self.backend.generate(**request)
@@ -0,0 +1,84 @@
+"""
+Context Cache Modul
+Registriert die statischen System-Prompts als Gemini Cached Content und
+verwaltet die Handles lokal (mit Ablaufzeit, persistiert als JSON).
+Ein Handle wird wiederverwendet, bis sich Prompt oder Modell ändern oder er abläuft.
+"""
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+# Handles kurz vor Ablauf nicht mehr verwenden (Request könnte sonst ins Leere laufen)
+EXPIRY_MARGIN_S = 60
+# Nach fehlgeschlagenem Anlegen (z.B. Modell ohne Caching-Support) erst später erneut versuchen
+FAILURE_BACKOFF_S = 600
+
+
+class ContextCacheRegistry:
+
+    def __init__(self, backend, ttl_seconds=3600, min_chars=4096, registry_path=None):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self.registry_path = Path(registry_path) if registry_path else None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def cache_key(model, system_instruction):
+        return hashlib.sha256(f"{model}\0{system_instruction}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if self.registry_path and self.registry_path.exists():
+            try:
+                self._entries = json.loads(self.registry_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                self._entries = {}
+        self.purge_expired()
+
+    def _save(self):
+        if not self.registry_path:
+            return
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.registry_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._entries, indent=2), encoding="utf-8")
+        tmp.replace(self.registry_path)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if v["expires_at"] > now}
+
+    def get_or_create(self, model, system_instruction):
+        """
+        Gibt den Cache-Namen für (Modell, Prompt) zurück oder None,
+        wenn der Prompt zu kurz ist bzw. Caching für das Modell nicht klappt.
+        """
+        if not system_instruction or len(system_instruction) < self.min_chars:
+            return None
+
+        key = self.cache_key(model, system_instruction)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] - EXPIRY_MARGIN_S > time.time():
+                return entry["name"]
+
+            try:
+                name = self.backend.create_cache(model, system_instruction, self.ttl_seconds)
+                entry = {"name": name, "model": model, "expires_at": time.time() + self.ttl_seconds, "created_at": time.time()}
+            except Exception as e:
+                print(f"Context Cache Error ({model}): {e}")
+                entry = {"name": None, "model": model, "expires_at": time.time() + FAILURE_BACKOFF_S, "created_at": time.time()}
+
+            self._entries[key] = entry
+            self._save()
+            return entry["name"]
+
+    def invalidate(self, model, system_instruction):
+        """Handle verwerfen (z.B. serverseitig abgelaufen oder gelöscht)"""
+        with self._lock:
+            if self._entries.pop(self.cache_key(model, system_instruction), None):
+                self._save()
@@ -0,0 +1,186 @@
+"""
+Korrektur Modul
+Hilfsfunktionen für die Check -> Fix -> Re-Check Schleife:
+Prüfbericht auslesen, Fehlerliste bilden, geänderte Artikel-Abschnitte bestimmen.
+"""
+import json
+import re
+
+from json_repair import JSONRepairError, parse_json_text
+from prompt_schema import extract_output_template
+
+JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+# Artikel-Bereiche, die feldweise verglichen werden (sonst ganzer Top-Level-Key)
+NESTED_SECTIONS = ("online", "print")
+# Felder aus dem Fix-Output, die nicht zum Artikel gehören
+FIX_META_KEYS = ("korrekturen_durchgefuehrt", "nicht_korrigiert")
+# Metadaten des Write-Outputs: werden übernommen, aber nicht nachgeprüft
+ARTICLE_META_KEYS = ("confidence", "abweichungen_von_draft")
+# Fehlerlisten im Prüfbericht (Abschnitt, Feld)
+CHECK_ERROR_LISTS = (("fakten", "fehler"), ("sprache", "muss_fehler"), ("sprache", "kann_fehler"),
+                     ("sprache", "stil_hinweise"), ("struktur", "abweichungen"))
+# Zitate kürzer als das werden nicht im Artikeltext gesucht (zu unspezifisch)
+MIN_QUOTE_CHARS = 10
+
+
+def parse_check_report(check_text):
+    """Liest das JSON aus dem Check-Ergebnis (Markdown mit ```json Block oder reines JSON)"""
+    if isinstance(check_text, dict):
+        return check_text
+    blocks = JSON_BLOCK_RE.findall(check_text or "")
+    for candidate in blocks + [check_text or ""]:
+        try:
+            data, _ = parse_json_text(candidate)
+        except JSONRepairError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def collect_check_errors(report):
+    """
+    Fehlerliste für den Fix-Prompt: Fakten, MUSS- und KANN-Fehler, Strukturabweichungen.
+    Stil-Hinweise bleiben außen vor (laut Fix-Prompt ohnehin zu ignorieren).
+    """
+    if not isinstance(report, dict):
+        return {}
+    fakten = report.get("fakten") or {}
+    sprache = report.get("sprache") or {}
+    struktur = report.get("struktur") or {}
+    errors = {
+        "fakten": fakten.get("fehler") or [],
+        "muss_fehler": sprache.get("muss_fehler") or [],
+        "kann_fehler": sprache.get("kann_fehler") or [],
+        "struktur": struktur.get("abweichungen") or [],
+    }
+    return {k: v for k, v in errors.items() if v}
+
+
+def needs_fix(report):
+    return bool(report) and report.get("status") != "GRÜN" and bool(collect_check_errors(report))
+
+
+def split_fix_output(fix_data):
+    """Trennt den korrigierten Artikel von den Korrektur-Metadaten"""
+    article = {k: v for k, v in fix_data.items() if k not in FIX_META_KEYS}
+    meta = {k: fix_data.get(k) or [] for k in FIX_META_KEYS}
+    return article, meta
+
+
+def changed_sections(before, after):
+    """Pfade ('online.body', 'verwendete_zitate', ...) der Abschnitte, die sich geändert haben"""
+    changed = []
+    for key in after:
+        if key in ARTICLE_META_KEYS:
+            continue
+        old, new = before.get(key), after.get(key)
+        if key in NESTED_SECTIONS and isinstance(old, dict) and isinstance(new, dict):
+            changed += [f"{key}.{field}" for field in new if old.get(field) != new.get(field)]
+        elif old != new:
+            changed.append(key)
+    return changed
+
+
+def merge_article(article, fixed_article):
+    """Fix-Output übernehmen; online/print feldweise (Fix liefert evtl. nur einzelne Felder)"""
+    merged = dict(article)
+    for key, value in fixed_article.items():
+        old = article.get(key)
+        if key in NESTED_SECTIONS and isinstance(old, dict) and isinstance(value, dict):
+            merged[key] = {**old, **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def select_sections(article, paths):
+    """Teilartikel, der nur die angegebenen Abschnitte enthält"""
+    selected = {}
+    for path in paths:
+        if "." in path:
+            section, field = path.split(".", 1)
+            selected.setdefault(section, {})[field] = article.get(section, {}).get(field)
+        else:
+            selected[path] = article.get(path)
+    return selected
+
+
+def _in_changed_section(error, paths, article):
+    """
+    Betrifft der Fehler einen der Abschnitte? "stelle" ist ein Pfad (online.body),
+    bei Sprachfehlern ein Zitat - das wird im Text vor der Korrektur gesucht.
+    Nur der vollständige Pfad zählt; im Zweifel bleibt der Fehler erhalten.
+    """
+    location = str(error.get("stelle") or "") if isinstance(error, dict) else str(error)
+    lowered = location.lower()
+    for path in paths:
+        if re.search(rf"(?<![\w.]){re.escape(path.lower())}(?![\w])", lowered):
+            return True
+        if len(location) >= MIN_QUOTE_CHARS:
+            section_text = json.dumps(select_sections(article, [path]), ensure_ascii=False)
+            if location.strip(' "„“') in section_text:
+                return True
+    return False
+
+
+def check_status(report):
+    """Ampel nach der Bewertungslogik des Check-Prompts"""
+    errors = collect_check_errors(report)
+    if errors.get("fakten") or errors.get("muss_fehler"):
+        return "ROT"
+    if errors:
+        return "GELB"
+    return "GRÜN"
+
+
+def merge_check_reports(previous, recheck, paths, article_before):
+    """
+    Der Re-Check sieht nur die geänderten Abschnitte. Fehler aus unveränderten
+    Abschnitten (und nicht korrigierte) bleiben aus dem vorherigen Bericht erhalten,
+    die der geänderten Abschnitte ersetzt der Re-Check. Status wird neu berechnet.
+    """
+    if not isinstance(recheck, dict):
+        return previous
+
+    def section_of(report, name):
+        value = report.get(name)
+        return value if isinstance(value, dict) else {}
+
+    merged = json.loads(json.dumps(previous))
+    for section, _ in CHECK_ERROR_LISTS:
+        merged[section] = section_of(merged, section)
+    for section, field in CHECK_ERROR_LISTS:
+        kept = [e for e in section_of(previous, section).get(field) or [] if not _in_changed_section(e, paths, article_before)]
+        merged[section][field] = kept + (section_of(recheck, section).get(field) or [])
+    merged["fakten"]["status"] = "FEHLER" if merged["fakten"]["fehler"] else "OK"
+    for key in ("zusammenfassung", "freigabe"):
+        if recheck.get(key):
+            merged[key] = recheck[key]
+    merged["status"] = check_status(merged)
+    return merged
+
+
+def format_check_report(report, note=None):
+    """Prüfbericht als Markdown mit JSON-Block (wie der Check-Output, lesbar für parse_check_report)"""
+    body = f"```json\n{json.dumps(report, ensure_ascii=False, indent=2)}\n```"
+    return f"{note}\n\n{body}" if note else body
+
+
+def build_fix_system_prompt(fix_prompt, write_prompt):
+    """
+    Der Fix-Prompt verweist auf das "Format wie Write-Prompt", kennt es aber nicht.
+    Hängt das kombinierte Output-Format (Write + Korrektur-Felder) an, daraus wird
+    auch das Response-Schema abgeleitet.
+    """
+    write_template = extract_output_template(write_prompt) or {}
+    fix_template = extract_output_template(fix_prompt) or {}
+    if not write_template:
+        return fix_prompt
+    merged = dict(write_template)
+    merged.update(fix_template)
+    return (
+        f"{fix_prompt}\n\n"
+        f"## Vollständiges Output-Format (Artikel aus dem Write-Prompt + Korrekturen)\n"
+        f"```json\n{json.dumps(merged, ensure_ascii=False, indent=2)}\n```\n"
+    )
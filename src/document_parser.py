@@ -3,8 +3,18 @@ Dokumenten-Parser Modul
 Angepasst für Streamlit UploadedFile Objekte
 """
 
-import fitz  # PyMuPDF
-import docx
+import io
+
+# fitz (PyMuPDF) und docx werden erst beim ersten Dokument importiert (schnellerer Kaltstart)
+
+
+class NamedBytesIO(io.BytesIO):
+    """Datei im Speicher mit .name - verhält sich wie Streamlits UploadedFile"""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
 
 class DocumentParser:
     
@@ -12,6 +22,7 @@ class DocumentParser:
     def parse_pdf(file_stream):
         text = ""
         try:
+            import fitz  # PyMuPDF
             with fitz.open(stream=file_stream.read(), filetype="pdf") as doc:
                 for page in doc:
                     text += page.get_text() + "\n"
@@ -23,6 +34,7 @@ class DocumentParser:
     def parse_docx(file_stream):
         text = ""
         try:
+            import docx
             doc = docx.Document(file_stream)
             for para in doc.paragraphs:
                 text += para.text + "\n"
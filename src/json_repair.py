@@ -0,0 +1,116 @@
+"""
+JSON Repair Modul
+Schnelle lokale Reparatur von LLM-JSON-Antworten: ```json Fences, Text vor/nach dem
+Objekt, abgeschnittene Ausgaben, Trailing Commas und unescapte Steuerzeichen in Strings.
+"""
+import json
+
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+class JSONRepairError(ValueError):
+    """Antwort ist auch nach der Reparatur kein gültiges JSON"""
+
+
+def strip_fences(text):
+    return (text or "").replace("```json", "").replace("```", "").strip()
+
+
+def _strip_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text):
+    """
+    Gibt einen reparierten JSON-String zurück (ohne Garantie auf Gültigkeit)
+    oder None, wenn kein Objekt/Array gefunden wurde.
+    """
+    s = strip_fences(text)
+    starts = [i for i in (s.find("{"), s.find("[")) if i >= 0]
+    if not starts:
+        return None
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    key_pending = False
+    last_sig = ""
+
+    for ch in s[min(starts):]:
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                in_string = False
+                out.append(ch)
+            elif ch < " ":
+                out.append(CONTROL_ESCAPES.get(ch, f"\\u{ord(ch):04x}"))
+            else:
+                out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+            key_pending = bool(stack) and stack[-1] == "{" and last_sig in ("{", ",")
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # Alles nach dem Wurzelobjekt ignorieren
+        else:
+            if ch == ":":
+                key_pending = False
+            out.append(ch)
+
+        if not ch.isspace():
+            last_sig = ch
+
+    # Abgeschnittene Ausgabe schließen
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    result = "".join(out).rstrip()
+    if stack:
+        if key_pending:
+            result += ":null"
+        if result.endswith(":"):
+            result += "null"
+        elif result.endswith(","):
+            result = result[:-1]
+        result += "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+    return result
+
+
+def parse_json_text(text):
+    """
+    Parsed eine LLM-Antwort als JSON, bei Bedarf mit lokaler Reparatur.
+    Rückgabe: (daten, repariert: bool). Wirft JSONRepairError, wenn beides scheitert.
+    """
+    clean = strip_fences(text)
+    try:
+        return json.loads(clean, strict=False), False
+    except json.JSONDecodeError as je:
+        first_error = je
+
+    repaired = repair_json(clean)
+    if repaired is not None:
+        try:
+            return json.loads(repaired, strict=False), True
+        except json.JSONDecodeError:
+            pass
+    raise JSONRepairError(f"JSON nicht reparierbar: {first_error}")
@@ -0,0 +1,396 @@
+"""
+LLM Backend Modul
+Austauschbare Backends hinter Config.generate_content:
+    gemini  - echte Gemini API (Standard)
+    record  - echte API, Antworten werden zusätzlich in eine Kassette geschrieben
+    replay  - Antworten aus einer Kassette (Key = Hash des Requests), kein Netzwerk
+    fake    - synthetische, schema-konforme Antworten mit konfigurierbarer Latenz/Fehlerrate
+Auswahl über das Secret/Env LLM_BACKEND.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from prompt_schema import count_string_leaves, extract_output_template, fill_template
+from token_budget import estimate_tokens
+
+BACKEND_MODES = ("gemini", "record", "replay", "fake")
+
+# Batch-Jobs: normalisierte Zustände (unabhängig vom Backend)
+BATCH_PENDING_STATES = ("pending", "running")
+BATCH_DONE_STATES = ("succeeded", "failed", "cancelled", "expired", "not_found")
+# Datumszeile des Workflows: ändert sich täglich, gehört nicht in den Kassetten-Key
+DATE_LINE_RE = re.compile(r"^CURRENT DATE: [^\n]*\n*", re.MULTILINE)
+
+
+class CassetteMissError(LookupError):
+    """Request ist nicht in der Kassette enthalten"""
+
+
+class FakeBackendError(RuntimeError):
+    """Simulierter API-Fehler des Fake-Backends"""
+
+
+def make_response(text, input_tokens=None, output_tokens=None):
+    """Antwortobjekt mit derselben Schnittstelle wie die Gemini-Response (.text, .usage_metadata)"""
+    usage = None
+    if input_tokens is not None or output_tokens is not None:
+        usage = SimpleNamespace(
+            prompt_token_count=input_tokens or 0,
+            candidates_token_count=output_tokens or 0,
+            total_token_count=(input_tokens or 0) + (output_tokens or 0)
+        )
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def request_key(model, user_content, system_instruction, temperature, max_output_tokens, json_mode):
+    """
+    Stabiler Hash eines Requests (Kassetten-Key, Seed für das Fake-Backend).
+    Die CURRENT DATE-Zeile bleibt außen vor, sonst passt eine Kassette nur am Aufnahmetag.
+    """
+    payload = json.dumps({
+        "model": model,
+        "system": DATE_LINE_RE.sub("", system_instruction) if isinstance(system_instruction, str) else system_instruction,
+        "user": DATE_LINE_RE.sub("", user_content) if isinstance(user_content, str) else user_content,
+        "temperature": temperature,
+        "max_output_tokens": max_output_tokens,
+        "json_mode": json_mode
+    }, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMBackend:
+    """
+    Basisklasse: generate() gibt ein Objekt mit .text und .usage_metadata zurück.
+    Bei cached_content wird system_instruction trotzdem mitgegeben; Backends mit
+    serverseitigem Cache lassen ihn dann weg, lokale Backends nutzen ihn direkt.
+
+    Batch-Schnittstelle (Bulk-Modus): batch_submit / batch_status / batch_results.
+    Ein Request ist ein Dict mit "key" und den Parametern von generate().
+    Ohne echte Batch-API läuft der Job lokal im Hintergrund über generate()
+    (Stand-in für Tests, Fake- und Replay-Backend). Lokale Jobs überleben keinen
+    Prozess-Neustart -> Status "not_found", der Bulk-Runner reicht sie neu ein.
+    """
+    name = "base"
+    batch_workers = 8
+
+    def _local_batches(self):
+        return self.__dict__.setdefault("_batches", {})
+
+    def batch_submit(self, model, requests, display_name=None):
+        """Reicht die Requests als einen Job ein und gibt dessen Namen zurück"""
+        job_name = f"batches/local-{uuid.uuid4().hex[:16]}"
+        job = {"state": "running", "display_name": display_name, "results": {}}
+        self._local_batches()[job_name] = job
+
+        def run_one(request):
+            params = {k: v for k, v in request.items() if k != "key"}
+            try:
+                return request["key"], self.generate(model, **params)
+            except Exception as e:
+                return request["key"], e
+
+        def run_all():
+            with ThreadPoolExecutor(max_workers=self.batch_workers) as pool:
+                job["results"] = dict(pool.map(run_one, requests))
+            job["state"] = "succeeded"
+
+        threading.Thread(target=run_all, name=f"local-batch-{job_name[-6:]}", daemon=True).start()
+        return job_name
+
+    def batch_status(self, job_name):
+        job = self._local_batches().get(job_name)
+        return job["state"] if job else "not_found"
+
+    def batch_results(self, job_name):
+        """{key: Response oder Exception} eines abgeschlossenen Jobs"""
+        job = self._local_batches().get(job_name)
+        return dict(job["results"]) if job else {}
+
+    def generate(self, model, user_content, system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        raise NotImplementedError
+
+    def create_cache(self, model, system_instruction, ttl_seconds):
+        """Legt einen Context Cache für den System-Prompt an und gibt dessen Namen zurück"""
+        raise NotImplementedError
+
+    def count_tokens(self, model, user_content, system_instruction=None):
+        """Input-Tokens eines Requests; ohne Tokenizer-API lokale Schätzung"""
+        return estimate_tokens(system_instruction) + estimate_tokens(str(user_content))
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, config):
+        self.config = config
+
+    @staticmethod
+    def _generation_config(system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        from google.genai import types
+
+        gen_config = types.GenerateContentConfig(
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            # System-Prompt steckt bereits im Cache
+            system_instruction=None if cached_content else system_instruction
+        )
+        if cached_content:
+            gen_config.cached_content = cached_content
+        if json_mode:
+            gen_config.response_mime_type = "application/json"
+            if response_schema:
+                gen_config.response_schema = response_schema
+        return gen_config
+
+    def generate(self, model, user_content, system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        if not self.config.client:
+            raise ValueError("API Key fehlt!")
+
+        return self.config.client.models.generate_content(
+            model=model,
+            contents=user_content,
+            config=self._generation_config(system_instruction, temperature, max_output_tokens, json_mode, cached_content, response_schema)
+        )
+
+    def batch_submit(self, model, requests, display_name=None):
+        """Gemini Batch API mit Inline-Requests (halber Preis, eigenes Kontingent)"""
+        from google.genai import types
+
+        if not self.config.client:
+            raise ValueError("API Key fehlt!")
+
+        inlined = []
+        for request in requests:
+            params = {k: v for k, v in request.items() if k not in ("key", "user_content")}
+            inlined.append(types.InlinedRequest(
+                contents=request["user_content"],
+                metadata={"key": request["key"]},
+                config=self._generation_config(**params)
+            ))
+        job = self.config.client.batches.create(
+            model=model,
+            src=inlined,
+            config=types.CreateBatchJobConfig(display_name=display_name)
+        )
+        return job.name
+
+    def batch_status(self, job_name):
+        if not self.config.client:
+            raise ValueError("API Key fehlt!")
+        try:
+            job = self.config.client.batches.get(name=job_name)
+        except Exception as e:
+            if "NOT_FOUND" in str(e) or "404" in str(e):
+                return "not_found"
+            raise
+        state = job.state.name.replace("JOB_STATE_", "").lower() if job.state else "pending"
+        if state in ("succeeded", "partially_succeeded"):
+            return "succeeded"
+        if state in ("failed", "cancelled", "cancelling", "expired"):
+            return "cancelled" if state == "cancelling" else state
+        return "running" if state == "running" else "pending"
+
+    def batch_results(self, job_name):
+        job = self.config.client.batches.get(name=job_name)
+        results = {}
+        for index, item in enumerate((job.dest.inlined_responses if job.dest else None) or []):
+            key = (item.metadata or {}).get("key", str(index))
+            results[key] = item.response if item.response is not None else RuntimeError(str(item.error))
+        return results
+
+    def create_cache(self, model, system_instruction, ttl_seconds):
+        from google.genai import types
+
+        if not self.config.client:
+            raise ValueError("API Key fehlt!")
+
+        cache = self.config.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                display_name=f"klt-{hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:12]}",
+                ttl=f"{int(ttl_seconds)}s"
+            )
+        )
+        return cache.name
+
+    def count_tokens(self, model, user_content, system_instruction=None):
+        if not self.config.client:
+            raise ValueError("API Key fehlt!")
+        # System-Prompt als zusätzlicher Content mitzählen (count_tokens kennt keine system_instruction)
+        contents = [system_instruction, user_content] if system_instruction else user_content
+        return self.config.client.models.count_tokens(model=model, contents=contents).total_tokens
+
+
+class RecordingBackend(LLMBackend):
+    """Leitet an ein echtes Backend weiter und schreibt jede Antwort in die Kassette (JSONL)"""
+    name = "record"
+
+    def __init__(self, inner, cassette_path):
+        self.inner = inner
+        self.cassette_path = Path(cassette_path)
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def generate(self, model, user_content, system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        response = self.inner.generate(model, user_content, system_instruction, temperature, max_output_tokens, json_mode, cached_content, response_schema)
+        usage = getattr(response, "usage_metadata", None)
+        entry = {
+            "key": request_key(model, user_content, system_instruction, temperature, max_output_tokens, json_mode),
+            "model": model,
+            "text": response.text,
+            "input_tokens": getattr(usage, "prompt_token_count", None),
+            "output_tokens": getattr(usage, "candidates_token_count", None)
+        }
+        with self._lock, open(self.cassette_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
+
+    def create_cache(self, model, system_instruction, ttl_seconds):
+        return self.inner.create_cache(model, system_instruction, ttl_seconds)
+
+    def count_tokens(self, model, user_content, system_instruction=None):
+        return self.inner.count_tokens(model, user_content, system_instruction)
+
+    def batch_submit(self, model, requests, display_name=None):
+        # Über die echte Batch-API (falls vorhanden); Kassette bleibt den synchronen Requests vorbehalten
+        return self.inner.batch_submit(model, requests, display_name)
+
+    def batch_status(self, job_name):
+        return self.inner.batch_status(job_name)
+
+    def batch_results(self, job_name):
+        return self.inner.batch_results(job_name)
+
+
+class ReplayBackend(LLMBackend):
+    """Spielt aufgezeichnete Antworten ab; unbekannte Requests -> CassetteMissError"""
+    name = "replay"
+
+    def __init__(self, cassette_path, latency_ms=0):
+        self.cassette_path = Path(cassette_path)
+        self.latency_ms = latency_ms
+        self.entries = {}
+        if self.cassette_path.exists():
+            with open(self.cassette_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def generate(self, model, user_content, system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        # Key immer über den vollen System-Prompt -> Kassetten gelten mit und ohne Caching
+        key = request_key(model, user_content, system_instruction, temperature, max_output_tokens, json_mode)
+        entry = self.entries.get(key)
+        if entry is None:
+            raise CassetteMissError(f"Request {key[:12]} nicht in Kassette {self.cassette_path}")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return make_response(entry["text"], entry.get("input_tokens"), entry.get("output_tokens"))
+
+    def create_cache(self, model, system_instruction, ttl_seconds):
+        return f"cachedContents/replay-{hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:16]}"
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministisches Fake-Gemini ohne Netzwerk.
+    JSON-Antworten werden aus dem Output-Template des System-Prompts erzeugt,
+    Text-Antworten (Check) enthalten das Template als ```json Block.
+    Gleicher Request + gleicher Seed -> gleiche Antwort, Latenz und Fehler.
+    """
+    name = "fake"
+
+    def __init__(self, latency_ms=800, latency_sigma=0.3, error_rate=0.0, output_tokens=600, seed=0, chars_per_token=4.0, malformed_rate=0.0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        # Anteil JSON-Antworten, die abgeschnitten werden (testet die lokale Reparatur)
+        self.malformed_rate = malformed_rate
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self.chars_per_token = chars_per_token
+        # Lokale Nachbildung von Gemini Cached Content: Name -> Anzahl Prompt-Tokens
+        self.caches = {}
+
+    def _rng(self, key):
+        return random.Random(f"{self.seed}:{key}")
+
+    def _count_tokens(self, text):
+        return max(1, int(len(text or "") / self.chars_per_token))
+
+    def sample_latency(self, rng):
+        """Log-normalverteilte Latenz in Sekunden (Median = latency_ms)"""
+        if self.latency_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _render(self, system_instruction, json_mode, rng):
+        template = extract_output_template(system_instruction or "")
+        if template is None:
+            if json_mode:
+                return json.dumps({"text": "Fake-Antwort"}, ensure_ascii=False)
+            return "Fake-Antwort ohne Output-Template."
+
+        # Ziel-Tokenzahl grob über die Wortanzahl pro String-Feld steuern
+        leaves = max(1, count_string_leaves(template))
+        words_per_string = max(1, int(self.output_tokens * 0.75 / leaves))
+        data = fill_template(template, rng, words_per_string)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        return text if json_mode else f"## Prüfbericht (Fake)\n\n```json\n{text}\n```"
+
+    def generate(self, model, user_content, system_instruction=None, temperature=0.1, max_output_tokens=8192, json_mode=False, cached_content=None, response_schema=None):
+        if cached_content and cached_content not in self.caches:
+            raise FakeBackendError(f"404 NOT_FOUND: Cached content {cached_content} existiert nicht")
+
+        key = request_key(model, user_content, system_instruction, temperature, max_output_tokens, json_mode)
+        rng = self._rng(key)
+
+        time.sleep(self.sample_latency(rng))
+        if rng.random() < self.error_rate:
+            raise FakeBackendError("503 UNAVAILABLE: Simulierter Fehler des Fake-Backends")
+
+        text = self._render(system_instruction, json_mode, rng)
+        if json_mode and rng.random() < self.malformed_rate:
+            text = text[:rng.randint(len(text) // 2, len(text) - 1)]
+        input_tokens = self._count_tokens(system_instruction) + self._count_tokens(str(user_content))
+        response = make_response(text, input_tokens, min(self._count_tokens(text), max_output_tokens))
+        response.usage_metadata.cached_content_token_count = self.caches.get(cached_content, 0)
+        return response
+
+    def create_cache(self, model, system_instruction, ttl_seconds):
+        name = f"cachedContents/fake-{hashlib.sha256(f'{model}:{system_instruction}'.encode('utf-8')).hexdigest()[:16]}"
+        self.caches[name] = self._count_tokens(system_instruction)
+        return name
+
+
+def create_backend(mode, config):
+    """Erzeugt das Backend anhand des Modus; Parameter kommen aus Secrets/Env."""
+    mode = (mode or "gemini").lower()
+    get = config._get_secret
+    cassette = get("LLM_CASSETTE") or str(config.DATA_DIR / "cassette.jsonl")
+
+    if mode == "gemini":
+        return GeminiBackend(config)
+    if mode == "record":
+        return RecordingBackend(GeminiBackend(config), cassette)
+    if mode == "replay":
+        return ReplayBackend(cassette, latency_ms=float(get("LLM_REPLAY_LATENCY_MS") or 0))
+    if mode == "fake":
+        return FakeBackend(
+            latency_ms=float(get("FAKE_LLM_LATENCY_MS") or 800),
+            latency_sigma=float(get("FAKE_LLM_LATENCY_SIGMA") or 0.3),
+            error_rate=float(get("FAKE_LLM_ERROR_RATE") or 0),
+            output_tokens=int(get("FAKE_LLM_OUTPUT_TOKENS") or 600),
+            seed=int(get("FAKE_LLM_SEED") or 0),
+            malformed_rate=float(get("FAKE_LLM_MALFORMED_RATE") or 0)
+        )
+    raise ValueError(f"Unbekanntes LLM_BACKEND '{mode}', erlaubt: {', '.join(BACKEND_MODES)}")
@@ -9,8 +9,10 @@ from typing import List
 class WorkflowLogger:
     """Logger für Workflow-Status und Debug-Infos"""
     
-    def __init__(self):
+    def __init__(self, max_entries=None):
         self.logs = []
+        # Obergrenze für langlebige Prozesse (API-Server); None = unbegrenzt
+        self.max_entries = max_entries
     
     def log(self, message: str, level: str = "INFO"):
         """
@@ -21,6 +23,8 @@ class WorkflowLogger:
         # Print ist nützlich für Server-Logs (Streamlit Console)
         print(log_entry)
         self.logs.append(log_entry)
+        if self.max_entries and len(self.logs) > self.max_entries:
+            del self.logs[:-self.max_entries]
         return log_entry
     
     def info(self, message: str):
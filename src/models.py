@@ -13,3 +13,20 @@ AVAILABLE_MODELS = [
 
 # Das Standard-Modell (wird genutzt, wenn nichts ausgewählt ist)
 DEFAULT_MODEL = AVAILABLE_MODELS[1]
+
+# Kontextfenster und max. Output-Tokens je Modell (für das Token-Budget).
+# thinking_reserve: Thinking-Tokens zählen bei Thinking-Modellen gegen max_output_tokens,
+# dieser Puffer kommt zum Output-Limit des Schritts hinzu
+MODEL_LIMITS = {
+    "gemini-2.0-flash-exp":     {"context": 1048576, "max_output": 8192, "thinking_reserve": 0},
+    "gemini-flash-latest":      {"context": 1048576, "max_output": 65536, "thinking_reserve": 8192},
+    "gemini-flash-lite-latest": {"context": 1048576, "max_output": 65536, "thinking_reserve": 4096},
+    "gemini-3-pro-preview":     {"context": 1048576, "max_output": 65536, "thinking_reserve": 16384}
+}
+
+# Konservativer Fallback für unbekannte Modelle
+DEFAULT_LIMITS = {"context": 1048576, "max_output": 8192, "thinking_reserve": 0}
+
+
+def get_model_limits(model_name):
+    return MODEL_LIMITS.get(model_name or DEFAULT_MODEL, DEFAULT_LIMITS)
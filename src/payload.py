@@ -0,0 +1,96 @@
+"""
+Payload Modul
+Projiziert die JSON-Ergebnisse der Vorstufen auf die Felder, die der jeweilige
+Schritt tatsächlich braucht, entfernt leere Werte und serialisiert kompakt.
+"""
+import json
+
+from token_budget import estimate_tokens
+
+# Welche Felder (Punkt-Pfade) ein Schritt aus welchem Vorstufen-Ergebnis nutzt.
+# Nicht vorhandene Pfade werden ignoriert; passt gar nichts (z.B. anderer Prompt
+# aus Langfuse mit eigener Struktur), wird das komplette Objekt gesendet.
+_EXTRACTION_FACTS = ["nachrichtenkern", "entities", "zitate", "quellen", "fakten", "regional", "sperrfristen"]
+
+STEP_FIELDS = {
+    "draft": {
+        "extraction": ["metadata.typ", "metadata.absender", "metadata.betreff"] + _EXTRACTION_FACTS + ["medien"],
+    },
+    "write": {
+        "extraction": ["metadata.typ"] + _EXTRACTION_FACTS,
+        "concept": [
+            "headlines", "teaser.print.text", "teaser.online.text", "artikel_struktur",
+            "seo_optimierung.hauptkeyword", "seo_optimierung.nebenkeywords", "seo_optimierung.meta_description"
+        ],
+    },
+    "check": {
+        "extraction": _EXTRACTION_FACTS + ["kontakte"],
+        "article": ["online", "print", "verwendete_zitate"],
+    },
+    "fix": {
+        "extraction": _EXTRACTION_FACTS + ["kontakte"],
+    },
+}
+
+# Begründungen und Konfidenzen der Vorstufe sind für Folgeschritte irrelevant
+DROP_KEYS = ("reasoning", "confidence")
+
+
+def compact_dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def prune(value):
+    """Entfernt None/leere Strings/leere Container und DROP_KEYS rekursiv"""
+    if isinstance(value, dict):
+        pruned = {}
+        for k, v in value.items():
+            if k in DROP_KEYS:
+                continue
+            v = prune(v)
+            if v not in (None, "", [], {}):
+                pruned[k] = v
+        return pruned
+    if isinstance(value, list):
+        return [p for p in (prune(v) for v in value) if p not in (None, "", [], {})]
+    return value
+
+
+def project(data, paths):
+    """Übernimmt nur die angegebenen Punkt-Pfade (durch verschachtelte Dicts)"""
+    projected = {}
+    for path in paths:
+        parts = path.split(".")
+        node = data
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                node = None
+                break
+            node = node[part]
+        if node is None:
+            continue
+        target = projected
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = node
+    return projected
+
+
+def build_payload(step, source, data):
+    """
+    Gibt (kompakter JSON-String, Statistik) für einen Schritt zurück.
+    Statistik: geschätzte Tokens vorher (bisheriges json.dumps) und nachher.
+    """
+    if isinstance(data, str):
+        return data, None
+
+    full = json.dumps(data, ensure_ascii=False)
+    paths = STEP_FIELDS.get(step, {}).get(source)
+    selected = project(data, paths) if paths and isinstance(data, dict) else data
+    if not selected:
+        selected = data
+    text = compact_dumps(prune(selected))
+
+    before, after = estimate_tokens(full), estimate_tokens(text)
+    stats = {"before": before, "after": after, "saved_pct": round(100 * (before - after) / before, 1) if before else 0.0}
+    return text, stats
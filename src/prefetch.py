@@ -0,0 +1,130 @@
+"""
+Prefetch Modul
+Startet Scraping und Datei-Parsing im Hintergrund, sobald URL bzw. Anhänge in der
+UI geändert werden - nicht erst beim Klick auf "Workflow starten".
+Ergebnisse sind an URL bzw. Datei-Hash gebunden; ändert sich die Eingabe, wird der
+alte Prefetch verworfen (noch nicht gestartet -> abgebrochen, laufend -> ignoriert).
+"""
+import hashlib
+import threading
+from concurrent.futures import CancelledError
+
+from document_parser import NamedBytesIO
+
+
+def scrape_key(url):
+    """Gleiche Bedingung wie im Workflow: nur Presseportal-URLs werden gescrapt"""
+    url = (url or "").strip()
+    return url if "presseportal" in url else None
+
+
+def snapshot_files(uploaded_files):
+    """
+    Kopiert die Uploads in eigene Buffer: der Hintergrund-Thread darf nicht auf
+    den UploadedFile-Objekten der Session seeken/lesen.
+    """
+    return [NamedBytesIO(f.name, f.getvalue()) for f in uploaded_files or []]
+
+
+def upload_key(uploaded_files):
+    """
+    Günstiger Schlüssel aus den UploadedFile-Metadaten (ohne Inhalt zu lesen).
+    None, wenn die Objekte keine file_id haben -> Inhalt muss gehasht werden.
+    """
+    files = uploaded_files or []
+    if not all(hasattr(f, "file_id") for f in files):
+        return None
+    return tuple((f.file_id, f.name, f.size) for f in files)
+
+
+def files_key(files):
+    if not files:
+        return None
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(f.name.encode("utf-8") + b"\0" + hashlib.sha256(f.getvalue()).digest())
+    return digest.hexdigest()
+
+
+class Prefetcher:
+    """
+    Ein Prefetcher pro Session (liegt im session_state), der Executor wird geteilt.
+    Pro Art ("scrape", "files") gibt es höchstens einen aktuellen Prefetch.
+    """
+
+    def __init__(self, executor, scraper, document_parser):
+        self.executor = executor
+        self.scraper = scraper
+        self.document_parser = document_parser
+        self._current = {}
+        self._lock = threading.Lock()
+        # (upload_key, files_key) der zuletzt kopierten Uploads
+        self._uploads = (None, None)
+
+    def _files_key(self, uploaded_files):
+        """
+        (files_key, Kopie der Uploads). Kopieren und Hashen nur, wenn sich die Uploads
+        laut Metadaten geändert haben; sonst Kopie None (Prefetch läuft bereits).
+        """
+        cheap = upload_key(uploaded_files)
+        if cheap is not None and cheap == self._uploads[0]:
+            return self._uploads[1], None
+        files = snapshot_files(uploaded_files)
+        key = files_key(files)
+        self._uploads = (cheap, key)
+        return key, files
+
+    def _submit(self, kind, key, fn, *args):
+        with self._lock:
+            current = self._current.get(kind)
+            if current and current[0] == key:
+                return current[1]
+            if current:
+                current[1].cancel()
+            if key is None:
+                self._current.pop(kind, None)
+                return None
+            future = self.executor.submit(fn, *args)
+            self._current[kind] = (key, future)
+            return future
+
+    def update(self, url_input, uploaded_files):
+        """Bei jedem Rerun aufrufen; startet nur bei geänderter Eingabe einen neuen Prefetch"""
+        url = scrape_key(url_input)
+        self._submit("scrape", url, self.scraper.scrape, url)
+        key, files = self._files_key(uploaded_files)
+        with self._lock:
+            current = self._current.get("files")
+        if files is None and key is not None and not (current and current[0] == key):
+            # Prefetch zu diesen Uploads wurde verworfen -> doch neu kopieren
+            files = snapshot_files(uploaded_files)
+        self._submit("files", key, self.document_parser.parse_uploaded_files, files)
+
+    def take(self, kind, key):
+        """
+        Wartet auf das Ergebnis, falls es zur aktuellen Eingabe gehört.
+        None, wenn nichts Passendes vorliegt -> der Workflow macht es selbst.
+        """
+        with self._lock:
+            current = self._current.get(kind)
+        if key is None or not current or current[0] != key:
+            return None
+        try:
+            return current[1].result()
+        except CancelledError:
+            return None
+        except Exception as e:
+            print(f"Prefetch Fehler ({kind}): {e}")
+            return None
+
+    def collect(self, url_input, uploaded_files):
+        """Vorab berechnete Ergebnisse für run_workflow: {"scraped_data": ..., "file_content": ...}"""
+        prefetched = {}
+        scraped = self.take("scrape", scrape_key(url_input))
+        # Fehlgeschlagenes Scraping (z.B. Timeout) beim Start lieber erneut versuchen
+        if scraped is not None and "error" not in scraped:
+            prefetched["scraped_data"] = scraped
+        parsed = self.take("files", self._files_key(uploaded_files)[0])
+        if parsed is not None:
+            prefetched["file_content"] = parsed
+        return prefetched
@@ -0,0 +1,263 @@
+"""
+Profiler Modul
+Opt-in Profiling eines einzelnen Workflow-Laufs:
+    sampling      - Hintergrund-Thread liest alle interval_s den Stack des Lauf-Threads
+                    (geringer Overhead, statistisch)
+    deterministic - sys.setprofile zeichnet jeden Funktionsaufruf auf
+                    (exakt, aber deutlich langsamer)
+Zusätzlich Wall-Clock-Spans pro @observe-Schritt. Export als speedscope-JSON
+(https://www.speedscope.app) und Top-N-Liste der teuersten Funktionen.
+Ohne aktiven Profiler kostet das nichts außer einem Thread-Local-Lookup pro Schritt.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_MODES = ("sampling", "deterministic")
+DEFAULT_INTERVAL_S = 0.005
+# Obergrenze für aufgezeichnete Events im deterministischen Modus (Speicher)
+MAX_EVENTS = 2_000_000
+
+_active = threading.local()
+
+
+def current_profiler():
+    """Profiler des laufenden Threads oder None"""
+    return getattr(_active, "profiler", None)
+
+
+class RunProfiler:
+
+    def __init__(self, mode="sampling", interval_s=DEFAULT_INTERVAL_S, top_n=25):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unbekannter Profiling-Modus '{mode}', erlaubt: {', '.join(PROFILE_MODES)}")
+        self.mode = mode
+        self.interval_s = interval_s
+        self.top_n = top_n
+        self.frames = []
+        self._frame_ids = {}
+        self.samples = []
+        self.weights = []
+        self.events = []
+        self.spans = []
+        self.truncated = False
+        self.duration_s = 0.0
+        self._span_depth = 0
+        self._stack = []
+
+    # ------------------------------------------------------------
+    # Frames
+    # ------------------------------------------------------------
+
+    def _frame_index(self, key, name, file=None, line=None):
+        index = self._frame_ids.get(key)
+        if index is None:
+            index = len(self.frames)
+            self._frame_ids[key] = index
+            frame = {"name": name}
+            if file:
+                frame["file"] = file
+                frame["line"] = line
+            self.frames.append(frame)
+        return index
+
+    def _code_index(self, code):
+        return self._frame_index(code, getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+
+    def _builtin_index(self, func):
+        module = getattr(func, "__module__", None) or type(getattr(func, "__self__", None)).__name__
+        name = f"{module}.{getattr(func, '__qualname__', repr(func))}"
+        return self._frame_index(("builtin", name), name)
+
+    # ------------------------------------------------------------
+    # Start / Stop
+    # ------------------------------------------------------------
+
+    def __enter__(self):
+        self._root = sys._getframe(1)
+        self._thread_id = threading.get_ident()
+        self._t0 = time.perf_counter()
+        _active.profiler = self
+        if self.mode == "sampling":
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(target=self._sample_loop, name="run-profiler", daemon=True)
+            self._sampler.start()
+        else:
+            sys.setprofile(self._on_event)
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == "sampling":
+            self._stop.set()
+            self._sampler.join()
+        else:
+            sys.setprofile(None)
+        self.duration_s = time.perf_counter() - self._t0
+        # Offene Frames (u.a. __exit__ selbst) am Ende schließen -> balancierte Events
+        while self._stack:
+            self.events.append(("C", self._stack.pop(), self.duration_s))
+        _active.profiler = None
+        return False
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            # Nur bis zur Funktion, die den Profiler gestartet hat (Streamlit-Runner etc. ausblenden)
+            while frame is not None:
+                stack.append(self._code_index(frame.f_code))
+                if frame is self._root:
+                    break
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def _on_event(self, frame, event, arg):
+        now = time.perf_counter() - self._t0
+        if event == "call":
+            index = self._code_index(frame.f_code)
+        elif event == "c_call":
+            index = self._builtin_index(arg)
+        elif self._stack:
+            # return / c_return / c_exception; Rücksprünge über den Startpunkt hinaus ignorieren
+            self.events.append(("C", self._stack.pop(), now))
+            return
+        else:
+            return
+        self.events.append(("O", index, now))
+        self._stack.append(index)
+        if len(self.events) >= MAX_EVENTS:
+            self.truncated = True
+            sys.setprofile(None)
+
+    # ------------------------------------------------------------
+    # Spans (Wall-Clock pro Schritt)
+    # ------------------------------------------------------------
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter() - self._t0
+        self._span_depth += 1
+        try:
+            yield
+        finally:
+            self._span_depth -= 1
+            self.spans.append({
+                "name": name,
+                "start_s": round(start, 6),
+                "end_s": round(time.perf_counter() - self._t0, 6),
+                "depth": self._span_depth
+            })
+
+    # ------------------------------------------------------------
+    # Auswertung
+    # ------------------------------------------------------------
+
+    def _aggregate(self):
+        """Self- und Gesamtzeit pro Frame (Rekursion nur einmal pro Stack gezählt)"""
+        self_s, total_s = {}, {}
+        if self.mode == "sampling":
+            for stack, weight in zip(self.samples, self.weights):
+                if not stack:
+                    continue
+                self_s[stack[-1]] = self_s.get(stack[-1], 0.0) + weight
+                for index in set(stack):
+                    total_s[index] = total_s.get(index, 0.0) + weight
+            return self_s, total_s
+
+        stack, last = [], 0.0
+        for kind, index, at in self.events:
+            if stack:
+                self_s[stack[-1][0]] = self_s.get(stack[-1][0], 0.0) + at - last
+            if kind == "O":
+                stack.append((index, at))
+            elif stack:
+                opened, started = stack.pop()
+                if all(opened != i for i, _ in stack):
+                    total_s[opened] = total_s.get(opened, 0.0) + at - started
+            last = at
+        return self_s, total_s
+
+    def top_functions(self, n=None):
+        self_s, total_s = self._aggregate()
+        ranked = sorted(self_s.items(), key=lambda item: item[1], reverse=True)[:n or self.top_n]
+        top = []
+        for index, seconds in ranked:
+            frame = self.frames[index]
+            location = f"{os.path.basename(frame['file'])}:{frame['line']}" if "file" in frame else "<builtin>"
+            top.append({
+                "function": frame["name"],
+                "location": location,
+                "self_s": round(seconds, 4),
+                "total_s": round(total_s.get(index, seconds), 4)
+            })
+        return top
+
+    def summary(self):
+        return {
+            "mode": self.mode,
+            "duration_s": round(self.duration_s, 3),
+            "samples": len(self.samples) if self.mode == "sampling" else None,
+            "events": len(self.events) if self.mode == "deterministic" else None,
+            "truncated": self.truncated,
+            "spans": sorted(self.spans, key=lambda s: (s["start_s"], s["depth"])),
+            "top": self.top_functions()
+        }
+
+    def to_speedscope(self, name="editorial_workflow"):
+        """speedscope File-Format: CPU-Profil + Wall-Clock-Spans als zweites Profil"""
+        frames = list(self.frames)
+        end = round(self.duration_s, 6)
+
+        if self.mode == "sampling":
+            cpu_profile = {
+                "type": "sampled", "name": f"{name} (sampling)", "unit": "seconds",
+                "startValue": 0, "endValue": end,
+                "samples": self.samples, "weights": [round(w, 6) for w in self.weights]
+            }
+        else:
+            cpu_profile = {
+                "type": "evented", "name": f"{name} (deterministic)", "unit": "seconds",
+                "startValue": 0, "endValue": end,
+                "events": [{"type": kind, "frame": index, "at": round(at, 6)} for kind, index, at in self.events]
+            }
+
+        # Spans sind korrekt verschachtelt (Aufrufstruktur) -> per Stack in O/C-Events umsetzen
+        span_events, open_spans = [], []
+
+        def close_top():
+            closing, index = open_spans.pop()
+            span_events.append({"type": "C", "frame": index, "at": closing["end_s"]})
+
+        for span in sorted(self.spans, key=lambda s: (s["start_s"], -s["end_s"])):
+            while open_spans and open_spans[-1][0]["end_s"] < span["end_s"]:
+                close_top()
+            frames.append({"name": span["name"]})
+            span_events.append({"type": "O", "frame": len(frames) - 1, "at": span["start_s"]})
+            open_spans.append((span, len(frames) - 1))
+        while open_spans:
+            close_top()
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "klt-workflow-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                cpu_profile,
+                {
+                    "type": "evented", "name": f"{name} (Schritte, Wall-Clock)", "unit": "seconds",
+                    "startValue": 0, "endValue": end,
+                    "events": span_events
+                }
+            ]
+        }
@@ -2,14 +2,25 @@
 Prompt Discovery Modul
 """
 import os
-import requests
+import threading
+import time
 from pathlib import Path
 from typing import Dict, List
 
+# Langfuse-Promptliste so lange wiederverwenden, danach im Hintergrund neu laden
+LANGFUSE_PROMPTS_TTL_S = 300
+
 class PromptDiscovery:
-    def __init__(self, prompt_dir: Path, langfuse_client=None):
+    def __init__(self, prompt_dir: Path, langfuse_client=None, ttl_seconds: float = LANGFUSE_PROMPTS_TTL_S):
         self.prompt_dir = prompt_dir
         self.langfuse = langfuse_client
+        self.ttl_seconds = ttl_seconds
+        self._langfuse_prompts: List[Dict] = []
+        self._fetched_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        # Erste Abfrage sofort starten, ohne den ersten Render zu blockieren
+        self.refresh_langfuse_prompts()
     
     def discover_file_prompts(self) -> List[Dict]:
         prompts = []
@@ -24,7 +35,45 @@ class PromptDiscovery:
             })
         return prompts
     
+    @staticmethod
+    def _langfuse_configured() -> bool:
+        return all(os.environ.get(k) for k in ('LANGFUSE_PUBLIC_KEY', 'LANGFUSE_SECRET_KEY', 'LANGFUSE_HOST'))
+
+    @property
+    def langfuse_pending(self) -> bool:
+        """Erste Langfuse-Abfrage läuft noch (UI zeigt bis dahin nur Datei-Prompts)"""
+        return self._fetched_at is None and self._refreshing
+
+    def refresh_langfuse_prompts(self, wait: bool = False):
+        """Lädt die Langfuse-Promptliste im Hintergrund neu (höchstens eine Abfrage gleichzeitig)"""
+        if not self._langfuse_configured():
+            return
+        with self._lock:
+            if self._refreshing:
+                thread = None
+            else:
+                self._refreshing = True
+                thread = threading.Thread(target=self._refresh, name="prompt-discovery", daemon=True)
+                thread.start()
+        if wait and thread:
+            thread.join()
+
+    def _refresh(self):
+        try:
+            prompts = self._fetch_langfuse_prompts()
+            with self._lock:
+                self._langfuse_prompts = prompts
+                self._fetched_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
     def discover_langfuse_prompts(self) -> List[Dict]:
+        """Gecachte Liste; ist sie älter als die TTL, wird im Hintergrund aktualisiert"""
+        if self._fetched_at is None or time.monotonic() - self._fetched_at > self.ttl_seconds:
+            self.refresh_langfuse_prompts()
+        return list(self._langfuse_prompts)
+
+    def _fetch_langfuse_prompts(self) -> List[Dict]:
         prompts = []
         pk = os.environ.get('LANGFUSE_PUBLIC_KEY')
         sk = os.environ.get('LANGFUSE_SECRET_KEY')
@@ -34,6 +83,7 @@ class PromptDiscovery:
             return prompts
             
         try:
+            import requests
             base_url = base_url.rstrip('/')
             url = f"{base_url}/api/public/v2/prompts"
             response = requests.get(url, auth=(pk, sk), headers={'Content-Type': 'application/json'}, timeout=5)
@@ -62,7 +112,7 @@ class PromptDiscovery:
         all_prompts = self.discover_file_prompts() + self.discover_langfuse_prompts()
         
         # Neue Kategorie: write
-        categorized = {"extraction": [], "draft": [], "write": [], "control": []}
+        categorized = {"extraction": [], "draft": [], "write": [], "control": [], "fix": []}
         
         for prompt in all_prompts:
             n = prompt["name"].lower()
@@ -76,6 +126,8 @@ class PromptDiscovery:
                 categorized["draft"].append(prompt)
             elif "check" in n or "fact" in n or "control" in n:
                 categorized["control"].append(prompt)
+            elif "fix" in n or "korrektur" in n or "correct" in n:
+                categorized["fix"].append(prompt)
             else:
                 # Fallback
                 categorized["draft"].append(prompt)
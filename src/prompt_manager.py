@@ -1,16 +1,22 @@
 from pathlib import Path
 
 class PromptManager:
-    def __init__(self, prompt_dir, langfuse_client=None, use_langfuse=False):
+    def __init__(self, prompt_dir, langfuse_client=None, use_langfuse=False, langfuse_factory=None):
         self.prompt_dir = Path(prompt_dir)
         self.langfuse = langfuse_client
         self.use_langfuse = use_langfuse and langfuse_client is not None
+        # Alternativ: Client erst beim ersten Langfuse-Prompt holen (None = nicht verfügbar)
+        self.langfuse_factory = langfuse_factory
     
     def load_prompt_by_config(self, config: dict) -> str:
         name = config.get("name")
         source = config.get("source", "file")
         version = config.get("version", "production")
         
+        if source == "langfuse" and not self.use_langfuse and self.langfuse_factory:
+            self.langfuse = self.langfuse_factory()
+            self.use_langfuse = self.langfuse is not None
+
         if source == "langfuse" and self.use_langfuse:
             try:
                 # Bei Langfuse "latest" entspricht keinem Label -> hole aktuelle Version
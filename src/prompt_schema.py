@@ -0,0 +1,196 @@
+"""
+Prompt Schema Modul
+Liest das Output-Format (```json Block) aus den Prompts und interpretiert
+die Platzhalter ("[String: ...]", "[Integer 1-3]", "GRÜN | GELB | ROT", ...).
+"""
+import json
+import re
+from functools import lru_cache
+
+JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+TYPE_PREFIX_RE = re.compile(r"^(String|Integer|Number|Float|Boolean)(\s*\|\s*null)?\b\s*([\d\-]*)\s*:?\s*(.*)$", re.DOTALL)
+RANGE_RE = re.compile(r"^\d+\s*-\s*\d+$")
+ENUM_PART_RE = re.compile(r"^[\wÄÖÜäöüß ]{1,24}$")
+
+TYPE_MAP = {"String": "string", "Integer": "integer", "Number": "number", "Float": "number", "Boolean": "boolean"}
+# Objekte mit frei wählbaren Keys ({"[absatz_nummer]": ...}) werden im Schema zu einer
+# Liste von {"absatz_nummer": ..., "inhalt": ...} (response_schema kennt keine freien Keys)
+DYNAMIC_VALUE_KEY = "inhalt"
+
+
+@lru_cache(maxsize=64)
+def extract_output_template(prompt_text):
+    """
+    Gibt das letzte parsebare JSON-Template aus dem Prompt zurück (Output-Format steht am Ende).
+    None, wenn der Prompt kein Template enthält.
+    """
+    template = None
+    for block in JSON_BLOCK_RE.findall(prompt_text or ""):
+        # "[...]" steht in den Prompts für "weitere Einträge wie oben"
+        candidate = re.sub(r"\[\s*\.\.\.\s*\]", "[]", block)
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            template = parsed
+    return template
+
+
+def _enum_values(text):
+    parts = [p.strip().strip("'\"") for p in text.split("|")]
+    if len(parts) < 2 or not all(ENUM_PART_RE.match(p) for p in parts):
+        return None
+    return parts
+
+
+def parse_placeholder(value):
+    """
+    Interpretiert einen Platzhalter-String aus dem Template.
+    Rückgabe: {"type", "nullable", "enum", "description"}
+    """
+    spec = {"type": "string", "nullable": False, "enum": None, "description": ""}
+    if not isinstance(value, str):
+        return spec
+
+    text = value.strip()
+    if not (text.startswith("[") and text.endswith("]")):
+        # Unbeklammert: entweder Aufzählung ("GRÜN | GELB | ROT") oder Literal
+        spec["enum"] = _enum_values(text)
+        spec["description"] = text
+        return spec
+
+    inner = text[1:-1].strip()
+    match = TYPE_PREFIX_RE.match(inner)
+    if match:
+        spec["type"] = TYPE_MAP[match.group(1)]
+        spec["nullable"] = bool(match.group(2))
+        inner = match.group(4).strip()
+    elif RANGE_RE.match(inner):
+        spec["type"] = "integer"
+    elif inner.startswith("Array of Strings"):
+        inner = inner.split(":", 1)[-1].strip()
+
+    if spec["type"] == "string":
+        spec["enum"] = _enum_values(inner)
+    spec["description"] = inner
+    return spec
+
+
+def is_dynamic_key(key):
+    """Keys wie "[absatz_nummer]" stehen für frei wählbare Schlüssel"""
+    return key.startswith("[") and key.endswith("]")
+
+
+def fill_template(template, rng, words_per_string=6):
+    """Erzeugt ein zum Template passendes Beispielobjekt (z.B. für das Fake-Backend)"""
+    if isinstance(template, dict):
+        filled = {}
+        for key, value in template.items():
+            out_key = f"{key[1:-1]}_{rng.randint(1, 9)}" if is_dynamic_key(key) else key
+            filled[out_key] = fill_template(value, rng, words_per_string)
+        return filled
+    if isinstance(template, list):
+        if not template:
+            return []
+        return [fill_template(template[0], rng, words_per_string) for _ in range(rng.randint(1, 3))]
+
+    spec = parse_placeholder(template)
+    if spec["enum"]:
+        return rng.choice(spec["enum"])
+    if spec["type"] == "integer":
+        return rng.randint(1, 3)
+    if spec["type"] == "number":
+        return round(rng.uniform(0, 100), 2)
+    if spec["type"] == "boolean":
+        return rng.random() < 0.5
+    return " ".join(rng.choice(FILLER_WORDS) for _ in range(max(1, words_per_string)))
+
+
+def count_string_leaves(template):
+    if isinstance(template, dict):
+        return sum(count_string_leaves(v) for v in template.values())
+    if isinstance(template, list):
+        return 2 * count_string_leaves(template[0]) if template else 0
+    return 1 if parse_placeholder(template)["type"] == "string" else 0
+
+
+FILLER_WORDS = (
+    "Stadt", "Verein", "Feuerwehr", "Einsatz", "Rathaus", "Bürgermeister", "Projekt", "Förderung",
+    "Veranstaltung", "Schule", "Polizei", "Besucher", "Euro", "Samstag", "Innenstadt", "Landkreis",
+    "erklärte", "kündigte", "eröffnet", "mehr", "neue", "regionale", "am", "im", "der", "die", "und"
+)
+
+
+def template_to_schema(template):
+    """
+    Wandelt ein Output-Template in ein Gemini response_schema (OpenAPI-Subset) um.
+    Objekte mit nur frei wählbaren Keys ("[absatz_nummer]") werden zu Listen von
+    Key/Wert-Objekten (siehe restore_dynamic_keys); gemischte Objekte behalten nur
+    die festen Keys. Felder sind nicht 'required' - die Prompts erlauben das Weglassen
+    fehlender Daten.
+    """
+    if isinstance(template, dict):
+        dynamic = [key for key in template if is_dynamic_key(key)]
+        if dynamic and len(dynamic) == len(template):
+            key_name = dynamic[0][1:-1]
+            value_schema = template_to_schema(template[dynamic[0]]) or {"type": "STRING"}
+            return {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {key_name: {"type": "STRING"}, DYNAMIC_VALUE_KEY: value_schema},
+                "property_ordering": [key_name, DYNAMIC_VALUE_KEY],
+                "required": [key_name, DYNAMIC_VALUE_KEY]
+            }}
+        properties = {}
+        for key, value in template.items():
+            if is_dynamic_key(key):
+                continue
+            schema = template_to_schema(value)
+            if schema is not None:
+                properties[key] = schema
+        if not properties:
+            return None
+        return {"type": "OBJECT", "properties": properties, "property_ordering": list(properties)}
+
+    if isinstance(template, list):
+        items = template_to_schema(template[0]) if template else {"type": "STRING"}
+        return {"type": "ARRAY", "items": items or {"type": "STRING"}}
+
+    spec = parse_placeholder(template)
+    schema = {"type": spec["type"].upper()}
+    if spec["enum"]:
+        schema["enum"] = spec["enum"]
+    if spec["nullable"]:
+        schema["nullable"] = True
+    return schema
+
+
+def restore_dynamic_keys(data, template):
+    """Macht die Key/Wert-Listen aus dem Schema wieder zu Objekten im Format des Prompts"""
+    if not isinstance(template, dict):
+        if isinstance(template, list) and template and isinstance(data, list):
+            return [restore_dynamic_keys(item, template[0]) for item in data]
+        return data
+
+    dynamic = [key for key in template if is_dynamic_key(key)]
+    if dynamic and len(dynamic) == len(template):
+        key_name = dynamic[0][1:-1]
+        if isinstance(data, list) and all(isinstance(e, dict) and key_name in e for e in data):
+            return {str(e[key_name]): restore_dynamic_keys(e.get(DYNAMIC_VALUE_KEY), template[dynamic[0]]) for e in data}
+        return data
+
+    if not isinstance(data, dict):
+        return data
+    return {key: restore_dynamic_keys(value, template[key]) if key in template else value for key, value in data.items()}
+
+
+def restore_dynamic_keys_for_prompt(data, prompt_text):
+    template = extract_output_template(prompt_text)
+    return restore_dynamic_keys(data, template) if template else data
+
+
+@lru_cache(maxsize=64)
+def response_schema_for_prompt(prompt_text):
+    """response_schema für einen Prompt oder None, wenn er kein JSON-Template enthält"""
+    template = extract_output_template(prompt_text)
+    return template_to_schema(template) if template else None
@@ -0,0 +1,223 @@
+"""
+Run Store Modul
+Persistiert Workflow-Läufe in SQLite: Eingaben, Prompt-Versionen, Modell-Settings,
+Schritt-Ergebnisse, Timings und Token-Usage.
+Inhalte werden zlib-komprimiert und per Content-Hash dedupliziert abgelegt.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Keys aus dem Workflow-Ergebnis, die als Run-Metadaten (nicht als Blob) gespeichert werden
+META_KEYS = ("timings", "usage")
+
+
+class RunStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        compressed_size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS runs (
+        id TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        status TEXT NOT NULL,
+        label TEXT,
+        model TEXT,
+        temperature REAL,
+        prompt_configs TEXT,
+        inputs_hash TEXT,
+        timings TEXT,
+        usage TEXT,
+        error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS run_steps (
+        run_id TEXT NOT NULL,
+        step TEXT NOT NULL,
+        blob_hash TEXT NOT NULL,
+        PRIMARY KEY (run_id, step)
+    );
+    CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 Connections sind an den Thread gebunden -> eine pro Thread
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ----------------------------------------------------------------
+    # BLOBS
+    # ----------------------------------------------------------------
+
+    @staticmethod
+    def _encode(value):
+        """Gibt (kind, bytes) zurück. Dicts/Listen als JSON, alles andere als Text."""
+        if isinstance(value, (dict, list)):
+            # Key-Reihenfolge bleibt erhalten (Feldreihenfolge des Prompts/Modells)
+            return "json", json.dumps(value, ensure_ascii=False).encode("utf-8")
+        return "text", str(value).encode("utf-8")
+
+    @staticmethod
+    def _decode(kind, payload):
+        text = payload.decode("utf-8")
+        return json.loads(text) if kind == "json" else text
+
+    def put_blob(self, value) -> str:
+        """Speichert einen Inhalt (dedupliziert) und gibt seinen Hash zurück."""
+        kind, payload = self._encode(value)
+        blob_hash = hashlib.sha256(kind.encode() + b"\0" + payload).hexdigest()
+        conn = self._conn()
+        exists = conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if not exists:
+            data = zlib.compress(payload, 6)
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, kind, data, size, compressed_size) VALUES (?, ?, ?, ?, ?)",
+                    (blob_hash, kind, data, len(payload), len(data))
+                )
+        return blob_hash
+
+    def get_blob(self, blob_hash):
+        row = self._conn().execute("SELECT kind, data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if not row:
+            return None
+        return self._decode(row["kind"], zlib.decompress(row["data"]))
+
+    # ----------------------------------------------------------------
+    # RUNS
+    # ----------------------------------------------------------------
+
+    def create_run(self, inputs: dict, prompt_configs: dict, model_settings: dict, label: str = None, prompt_texts: dict = None) -> str:
+        """
+        Legt einen neuen Run (Status 'running') an und gibt die Run-ID zurück.
+        prompt_texts: {step: aufgelöster System-Prompt}; als Blob gespeichert, der Hash
+        landet als "prompt_hash" in der Prompt-Config (Labels wie "latest" allein sagen
+        nicht, welche Fassung lief).
+        """
+        run_id = uuid.uuid4().hex
+        settings = model_settings or {}
+        inputs_hash = self.put_blob(inputs or {})
+        prompt_configs = {step: dict(config) for step, config in (prompt_configs or {}).items()}
+        for step, text in (prompt_texts or {}).items():
+            if step in prompt_configs and text is not None:
+                prompt_configs[step]["prompt_hash"] = self.put_blob(text)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO runs (id, created_at, status, label, model, temperature, prompt_configs, inputs_hash) "
+                "VALUES (?, ?, 'running', ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    datetime.now().isoformat(timespec="seconds"),
+                    label,
+                    settings.get("model"),
+                    settings.get("temp"),
+                    json.dumps(prompt_configs, ensure_ascii=False),
+                    inputs_hash,
+                )
+            )
+        return run_id
+
+    def save_step(self, run_id: str, step: str, value) -> str:
+        blob_hash = self.put_blob(value)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO run_steps (run_id, step, blob_hash) VALUES (?, ?, ?)",
+                (run_id, step, blob_hash)
+            )
+        return blob_hash
+
+    def save_results(self, run_id: str, results: dict, status: str = "complete"):
+        """Speichert alle Schritt-Ergebnisse eines Workflow-Laufs und schließt den Run ab."""
+        for step, value in results.items():
+            if step in META_KEYS or value is None:
+                continue
+            self.save_step(run_id, step, value)
+        self.finish_run(run_id, status=status, timings=results.get("timings"), usage=results.get("usage"))
+
+    def finish_run(self, run_id: str, status: str = "complete", timings: dict = None, usage: dict = None, error: str = None):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE runs SET status = ?, timings = ?, usage = ?, error = ? WHERE id = ?",
+                (
+                    status,
+                    json.dumps(timings) if timings else None,
+                    json.dumps(usage) if usage else None,
+                    error,
+                    run_id,
+                )
+            )
+
+    def update_label(self, run_id: str, label: str):
+        with self._conn() as conn:
+            conn.execute("UPDATE runs SET label = ? WHERE id = ?", (label, run_id))
+
+    # ----------------------------------------------------------------
+    # LESEN
+    # ----------------------------------------------------------------
+
+    def _row_to_run(self, row) -> Dict:
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "status": row["status"],
+            "label": row["label"],
+            "model": row["model"],
+            "temperature": row["temperature"],
+            "prompt_configs": json.loads(row["prompt_configs"]) if row["prompt_configs"] else {},
+            "timings": json.loads(row["timings"]) if row["timings"] else {},
+            "usage": json.loads(row["usage"]) if row["usage"] else {},
+            "error": row["error"],
+        }
+
+    def get_run(self, run_id: str) -> Optional[Dict]:
+        """Run-Metadaten inkl. Liste der Schritte (ohne deren Inhalt)."""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if not row:
+            return None
+        run = self._row_to_run(row)
+        run["inputs"] = self.get_blob(row["inputs_hash"]) if row["inputs_hash"] else {}
+        steps = conn.execute(
+            "SELECT s.step, s.blob_hash, b.size, b.compressed_size FROM run_steps s "
+            "JOIN blobs b ON b.hash = s.blob_hash WHERE s.run_id = ?",
+            (run_id,)
+        ).fetchall()
+        run["steps"] = {s["step"]: {"hash": s["blob_hash"], "size": s["size"], "compressed_size": s["compressed_size"]} for s in steps}
+        return run
+
+    def step_hash(self, run_id: str, step: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT blob_hash FROM run_steps WHERE run_id = ? AND step = ?", (run_id, step)
+        ).fetchone()
+        return row["blob_hash"] if row else None
+
+    def load_step(self, run_id: str, step: str):
+        """Lädt genau ein Schritt-Ergebnis (lazy, z.B. pro Tab)."""
+        blob_hash = self.step_hash(run_id, step)
+        return self.get_blob(blob_hash) if blob_hash else None
+
+    def list_runs(self, limit: int = 50) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM runs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._row_to_run(r) for r in rows]
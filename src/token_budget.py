@@ -0,0 +1,128 @@
+"""
+Token Budget Modul
+Pre-Flight-Prüfung vor jedem LLM-Aufruf: Input-Tokens schätzen (lokal oder per
+API), Kontextlimit des Modells einhalten, Output-Limit pro Schritt setzen und
+den Roh-Input bei Bedarf nach Priorität kürzen.
+"""
+from models import DEFAULT_MODEL, get_model_limits
+
+# Output-Limits pro Schritt (Präfix des Aufrufnamens) für den sichtbaren Text; dazu kommt
+# die Thinking-Reserve des Modells, gedeckelt durch dessen Output-Limit
+STEP_OUTPUT_LIMITS = {
+    "gemini-extraction": 8192,
+    "gemini-draft-concept": 4096,
+    "gemini-write-article": 4096,
+    "gemini-final-check": 4096,
+    "gemini-fix-article": 6144,
+    "gemini-recheck": 2048,
+}
+DEFAULT_OUTPUT_LIMIT = 8192
+
+# Sicherheitsabstand zum Kontextlimit (Schätzfehler, Formatierung)
+SAFETY_MARGIN = 0.05
+
+# Roh-Input-Abschnitte: höhere Priorität wird zuletzt gekürzt
+SECTION_PRIORITY = {"attachments": 1, "scrape": 2, "meta": 3, "text": 3}
+
+TRIM_MARKER = "\n[... gekürzt: {chars} Zeichen wegen Token-Budget ...]"
+
+
+class TokenBudgetError(ValueError):
+    """Input passt auch nach dem Kürzen nicht ins Kontextfenster"""
+
+
+def estimate_tokens(text, chars_per_token=4.0):
+    """Lokale Schätzung ohne API-Aufruf (deutscher Fließtext ~4 Zeichen pro Token)"""
+    if not text:
+        return 0
+    return max(1, int(len(text) / chars_per_token))
+
+
+def output_limit_for(step_name, model_name):
+    limit = DEFAULT_OUTPUT_LIMIT
+    for prefix, value in STEP_OUTPUT_LIMITS.items():
+        if step_name and step_name.startswith(prefix):
+            limit = value
+            break
+    limits = get_model_limits(model_name)
+    return min(limit + limits.get("thinking_reserve", 0), limits["max_output"])
+
+
+def fit_sections(sections, budget_tokens, chars_per_token=4.0):
+    """
+    Kürzt die Abschnitte {name: text}, bis ihre Summe ins Budget passt.
+    Niedrige Priorität zuerst (Anhänge > Scrape > manuelle Eingaben).
+    Rückgabe: (gekürzte Abschnitte, {name: entfernte Zeichen})
+    """
+    fitted = dict(sections)
+    trimmed = {}
+    overflow = sum(estimate_tokens(t, chars_per_token) for t in fitted.values()) - max(0, budget_tokens)
+    if overflow <= 0:
+        return fitted, trimmed
+
+    for name in sorted(fitted, key=lambda n: SECTION_PRIORITY.get(n, 0)):
+        if overflow <= 0:
+            break
+        text = fitted[name] or ""
+        remove_chars = min(len(text), int(overflow * chars_per_token) + len(TRIM_MARKER) + 16)
+        if remove_chars <= 0:
+            continue
+        keep = len(text) - remove_chars
+        fitted[name] = text[:keep] + TRIM_MARKER.format(chars=remove_chars) if keep > 0 else ""
+        trimmed[name] = remove_chars
+        overflow -= estimate_tokens(text, chars_per_token) - estimate_tokens(fitted[name], chars_per_token)
+    return fitted, trimmed
+
+
+class TokenBudget:
+
+    def __init__(self, config):
+        self.config = config
+        # "local" (Standard, kostenlos) oder "api" (exakter, ein zusätzlicher Request)
+        self.count_mode = (config._get_secret("TOKEN_COUNT_MODE") or "local").lower()
+        self.chars_per_token = float(config._get_secret("TOKEN_CHARS_PER_TOKEN") or 4.0)
+        max_input = config._get_secret("MAX_INPUT_TOKENS")
+        self.max_input_tokens = int(max_input) if max_input else None
+
+    def input_limit(self, model_name, step_name):
+        """Max. Input-Tokens: Kontextfenster minus reservierter Output, optional gedeckelt"""
+        context = get_model_limits(model_name)["context"]
+        limit = int((context - output_limit_for(step_name, model_name)) * (1 - SAFETY_MARGIN))
+        if self.max_input_tokens:
+            limit = min(limit, self.max_input_tokens)
+        return limit
+
+    def count(self, model_name, system_prompt, user_input):
+        if self.count_mode == "api":
+            try:
+                return self.config.backend.count_tokens(model_name, user_input, system_prompt)
+            except Exception as e:
+                print(f"Token Count API Fehler, lokale Schätzung: {e}")
+        return estimate_tokens(system_prompt, self.chars_per_token) + estimate_tokens(user_input, self.chars_per_token)
+
+    def plan(self, model_name, step_name, system_prompt, user_input):
+        """Pre-Flight für einen Aufruf; wirft TokenBudgetError, bevor Tokens ausgegeben werden"""
+        estimated = self.count(model_name, system_prompt, user_input)
+        limit = self.input_limit(model_name, step_name)
+        if estimated > limit:
+            raise TokenBudgetError(f"{step_name}: ~{estimated} Input-Tokens > Limit {limit} für {model_name or DEFAULT_MODEL}")
+        return {"estimated_input": estimated, "input_limit": limit, "max_output_tokens": output_limit_for(step_name, model_name)}
+
+    def fit_raw_input(self, model_name, step_name, system_prompt, sections, reserve_tokens=0):
+        """Kürzt die Roh-Input-Abschnitte so, dass der Aufruf (plus Reserve) ins Budget passt"""
+        budget = self.input_limit(model_name, step_name) - estimate_tokens(system_prompt, self.chars_per_token) - reserve_tokens
+        return fit_sections(sections, budget, self.chars_per_token)
+
+
+def calibration(usage):
+    """Verhältnis tatsächliche / geschätzte Input-Tokens über alle Aufrufe eines Laufs"""
+    pairs = [(u["input"], u["estimated_input"]) for u in (usage or {}).values()
+             if u.get("input") and u.get("estimated_input")]
+    if not pairs:
+        return None
+    return round(sum(a for a, _ in pairs) / sum(e for _, e in pairs), 3)
+
+
+def truncated_steps(usage):
+    """Aufrufe, die am Output-Limit abgebrochen wurden (finish_reason MAX_TOKENS)"""
+    return [name for name, u in (usage or {}).items() if (u or {}).get("finish_reason") == "MAX_TOKENS"]
@@ -0,0 +1,58 @@
+"""
+Tracing Modul
+Langfuse wird erst importiert, wenn es konfiguriert ist und tatsächlich gebraucht
+wird - der Import allein kostet beim Kaltstart mehrere hundert Millisekunden.
+"""
+import functools
+import os
+import threading
+
+from profiler import current_profiler
+
+_lock = threading.Lock()
+_module = None
+_loaded = False
+
+
+def langfuse_configured():
+    """Zugangsdaten liegen in der Umgebung (setzt Config beim Start)"""
+    return all(os.environ.get(k) for k in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"))
+
+
+def get_langfuse():
+    """Das langfuse-Modul oder None (nicht installiert bzw. nicht konfiguriert)"""
+    global _module, _loaded
+    if not langfuse_configured():
+        return None
+    with _lock:
+        if not _loaded:
+            try:
+                import langfuse
+                _module = langfuse
+            except ImportError:
+                _module = None
+            _loaded = True
+    return _module
+
+
+def observe(*decorator_args, **decorator_kwargs):
+    """
+    Wie langfuse.observe, aber der Decorator wird erst beim ersten Aufruf aufgelöst.
+    Ohne Langfuse wird die Funktion unverändert ausgeführt.
+    Läuft ein Profiler (profiler.RunProfiler), wird der Aufruf als Wall-Clock-Span erfasst.
+    """
+    def decorator(func):
+        resolved = []
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not resolved:
+                langfuse = get_langfuse()
+                resolved.append(langfuse.observe(*decorator_args, **decorator_kwargs)(func) if langfuse else func)
+            profiler = current_profiler()
+            if profiler is None:
+                return resolved[0](*args, **kwargs)
+            with profiler.span(decorator_kwargs.get("name") or func.__name__):
+                return resolved[0](*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,9 +1,9 @@
 """
 Web Scraper Modul für Presseportal.de
 """
-import requests
 import json
-from bs4 import BeautifulSoup
+
+# requests und bs4 werden erst beim ersten Scrape importiert (schnellerer Kaltstart)
 
 class PresseportalScraper:
     def __init__(self):
@@ -19,9 +19,20 @@ class PresseportalScraper:
             return {"error": "URL muss von presseportal.de sein"}
 
         try:
+            import requests
             response = requests.get(url, headers=self.headers, timeout=10)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            return self.parse_html(response.text, url)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def parse_html(self, html, url):
+        """
+        Parsed den HTML-Quelltext einer Presseportal-Meldung (ohne Netzwerk).
+        """
+        try:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(html, 'html.parser')
             
             data = {
                 "url": url,
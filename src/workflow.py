@@ -1,54 +1,155 @@
 """
 Workflow Modul - Updated: Fix für JSON Control Characters
 """
-import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-# Langfuse Import Check
-LANGFUSE_AVAILABLE = False
-try:
-    from langfuse import observe, Langfuse
-    LANGFUSE_AVAILABLE = True
-except ImportError:
-    # Dummy Decorator falls Langfuse fehlt
-    def observe(*args, **kwargs):
-        def decorator(func): return func
-        return decorator
-
+from correction import (
+    build_fix_system_prompt, changed_sections, collect_check_errors, format_check_report,
+    merge_article, merge_check_reports, needs_fix, parse_check_report, select_sections, split_fix_output
+)
 from document_parser import DocumentParser
+from payload import build_payload, compact_dumps
+from json_repair import JSONRepairError, parse_json_text, strip_fences
 from prompt_manager import PromptManager
 from logger import WorkflowLogger, StatusTracker
-from models import DEFAULT_MODEL
+from profiler import RunProfiler
+from prompt_schema import response_schema_for_prompt, restore_dynamic_keys_for_prompt
+from token_budget import output_limit_for
+from tracing import get_langfuse, observe
 from web_scraper import PresseportalScraper
 
+# Wie oft ein JSON-Schritt neu angefragt wird, wenn auch die lokale Reparatur scheitert
+JSON_STEP_ATTEMPTS = 2
+
+def usage_entry(model_name, response, plan=None):
+    """Token-Verbrauch eines Aufrufs (plus Pre-Flight-Schätzung, falls vorhanden)"""
+    meta = getattr(response, "usage_metadata", None)
+    entry = {"model": model_name}
+    if plan:
+        # Schätzung neben dem tatsächlichen Verbrauch -> Kalibrierung des Schätzers
+        entry["estimated_input"] = plan["estimated_input"]
+        entry["max_output"] = plan["max_output_tokens"]
+    if meta:
+        entry.update({
+            "input": meta.prompt_token_count,
+            "output": meta.candidates_token_count,
+            "total": meta.total_token_count
+        })
+        cached = getattr(meta, "cached_content_token_count", None)
+        if cached:
+            entry["cached"] = cached
+        thoughts = getattr(meta, "thoughts_token_count", None)
+        if thoughts:
+            entry["thoughts"] = thoughts
+    # MAX_TOKENS = am Output-Limit abgeschnitten (zeigt zu knappe Schritt-Limits)
+    candidates = getattr(response, "candidates", None) or []
+    finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    if finish_reason is not None:
+        entry["finish_reason"] = getattr(finish_reason, "name", str(finish_reason))
+    return entry
+
+
 class WorkflowProcessor:
     def __init__(self, config):
         self.config = config
-        lf_client = None
-        if config.enable_langfuse and LANGFUSE_AVAILABLE:
-            try:
-                lf_client = Langfuse()
-            except Exception: pass
+        # Langfuse Client erst bei Bedarf (Auth-Check der Config läuft im Hintergrund)
+        self._langfuse_client = None
+        self._langfuse_lock = threading.Lock()
 
-        self.prompt_manager = PromptManager(config.PROMPT_DIR, langfuse_client=lf_client, use_langfuse=config.enable_langfuse)
+        self.prompt_manager = PromptManager(config.PROMPT_DIR, langfuse_factory=self.get_langfuse_client)
         self.document_parser = DocumentParser()
         self.scraper = PresseportalScraper()
         self.logger = WorkflowLogger()
+        # Token-Usage pro Lauf (Processor wird zwischen Sessions geteilt -> pro Thread)
+        self._run_local = threading.local()
+
+    def get_langfuse_client(self):
+        """Langfuse Client oder None (nicht konfiguriert, Auth fehlgeschlagen, nicht installiert)"""
+        if not self.config.enable_langfuse:
+            return None
+        with self._langfuse_lock:
+            if self._langfuse_client is None:
+                langfuse = get_langfuse()
+                try:
+                    self._langfuse_client = langfuse.Langfuse() if langfuse else None
+                except Exception as e:
+                    print(f"Langfuse Client Fehler: {e}")
+            return self._langfuse_client
 
     def get_date_string(self):
         return datetime.now().strftime("%d. %B %Y")
 
+    def _payload(self, step, source, data):
+        """Projizierter, kompakter Payload; Token-Ersparnis wird pro Lauf gesammelt"""
+        text, stats = build_payload(step, source, data)
+        collected = getattr(self._run_local, "payload_stats", None)
+        if stats and collected is not None:
+            # Mehrfach genutzte Payloads (z.B. Re-Check) aufsummieren
+            entry = collected.setdefault(f"{step}.{source}", {"before": 0, "after": 0, "calls": 0})
+            entry["before"] += stats["before"]
+            entry["after"] += stats["after"]
+            entry["calls"] += 1
+            entry["saved_pct"] = round(100 * (entry["before"] - entry["after"]) / entry["before"], 1) if entry["before"] else 0.0
+        return text
+
+    def _log_payload_savings(self, stats):
+        if not stats:
+            return
+        before = sum(s["before"] for s in stats.values())
+        after = sum(s["after"] for s in stats.values())
+        details = ", ".join(f"{k} -{s['saved_pct']:.0f}%" for k, s in stats.items())
+        self.logger.info(f"📉 Payload: ~{before} → ~{after} Tokens ({details})")
+
+    @contextmanager
+    def _step_timer(self, timings, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[key] = round(time.perf_counter() - start, 3)
+
+    def _record_usage(self, name, model_name, response, plan=None):
+        usage = getattr(self._run_local, "usage", None)
+        if usage is None:
+            return None
+        entry = usage_entry(model_name, response, plan)
+        usage[name] = entry
+        return entry
+
     # ----------------------------------------------------------------
     # MASTER WORKFLOW (Parent Trace)
     # ----------------------------------------------------------------
     
     @observe(name="editorial_workflow") 
-    def run_workflow(self, uploaded_files, meta_input, text_input, url_input, prompt_configs, model_settings, status_callback=None):
+    def run_workflow(self, uploaded_files, meta_input, text_input, url_input, prompt_configs, model_settings, status_callback=None, max_fix_iterations=1, scraped_data=None, file_content=None, profile=None):
         """
         Führt alle Schritte aus: Scraping -> Parsing -> Extract -> Draft -> Write -> Check
+        Ist ein 'fix' Prompt konfiguriert, folgt bis zu max_fix_iterations mal Fix -> Re-Check.
+        scraped_data / file_content: bereits vorab (Prefetch) berechnete Ergebnisse.
+        profile: None (aus) | "sampling" | "deterministic" -> results["profile"] + speedscope-Datei
         """
+        args = (uploaded_files, meta_input, text_input, url_input, prompt_configs, model_settings,
+                status_callback, max_fix_iterations, scraped_data, file_content)
+        if not profile:
+            return self._run_pipeline(*args)
+
+        with RunProfiler(mode=profile) as profiler:
+            results = self._run_pipeline(*args)
+        results["profile"] = profiler.summary()
+        results["profile_speedscope"] = profiler.to_speedscope()
+        self.logger.info(f"🔬 Profil ({profile}): {profiler.duration_s:.2f}s, Top: "
+                         + ", ".join(f"{t['function']} {t['self_s']:.2f}s" for t in results["profile"]["top"][:3]))
+        return results
+
+    def _run_pipeline(self, uploaded_files, meta_input, text_input, url_input, prompt_configs, model_settings, status_callback, max_fix_iterations, scraped_data, file_content):
         results = {}
+        timings = {}
+        self._run_local.usage = {}
+        self._run_local.payload_stats = {}
         
         def update_ui(msg):
             if status_callback: status_callback(msg)
@@ -57,55 +158,156 @@ class WorkflowProcessor:
         # 0.1 Scraping (Optional)
         scraped_text = ""
         if url_input and "presseportal" in url_input:
-            update_ui(f"🌐 Scrape URL: {url_input}...")
-            scraped_data = self.scraper.scrape(url_input)
+            if scraped_data is None:
+                update_ui(f"🌐 Scrape URL: {url_input}...")
+                with self._step_timer(timings, "scrape"):
+                    scraped_data = self.scraper.scrape(url_input)
             
             if "error" not in scraped_data:
-                scraped_text = self.scraper.format_for_llm(scraped_data)
                 results["scraped_data"] = scraped_data 
             else:
                 update_ui(f"⚠️ Scraping Warnung: {scraped_data['error']}")
-                scraped_text = f"[FEHLER BEIM SCRAPING VON {url_input}: {scraped_data['error']}]"
+            scraped_text = self.scrape_section(url_input, scraped_data)
 
         # 0.2 Parsing Files
-        update_ui("📎 Parse Dokumente...")
-        file_content = self.step_parsing(uploaded_files)
+        if file_content is None:
+            update_ui("📎 Parse Dokumente...")
+            with self._step_timer(timings, "parsing"):
+                file_content = self.step_parsing(uploaded_files)
         
-        # Context zusammenbauen
-        full_raw_input = (
-            f"--- WEB SCRAPE INPUT ---\n{scraped_text}\n\n"
-            f"--- MANUAL META INPUT ---\n{meta_input}\n\n"
-            f"--- MANUAL TEXT INPUT ---\n{text_input}\n\n"
-            f"--- FILE ATTACHMENTS ---\n{file_content}"
-        )
+        # Context zusammenbauen (bei Überlänge zuerst Anhänge, dann Scrape kürzen)
+        full_raw_input, trimmed = self.compose_raw_input(scraped_text, meta_input, text_input, file_content, prompt_configs['extract'], model_settings)
+        if trimmed:
+            results["input_trimmed"] = trimmed
+            update_ui(f"✂️ Input gekürzt (Token-Budget): {', '.join(f'{k} -{v} Zeichen' for k, v in trimmed.items())}")
         results["raw"] = full_raw_input
         
         # 1. Extraction
         update_ui(f"🤖 Extraktion mit {prompt_configs['extract']['name']}...")
-        json_data = self.step_extraction(prompt_configs['extract'], full_raw_input, model_settings)
+        with self._step_timer(timings, "extract"):
+            json_data = self.step_extraction(prompt_configs['extract'], full_raw_input, model_settings)
         results["json"] = json_data
         
         # 2. Draft
         update_ui(f"💡 Konzept mit {prompt_configs['draft']['name']}...")
-        concept_json = self.step_draft_concept(prompt_configs['draft'], json_data, model_settings)
+        with self._step_timer(timings, "draft"):
+            concept_json = self.step_draft_concept(prompt_configs['draft'], json_data, model_settings)
         results["concept"] = concept_json
         
         # 3. Write
         update_ui(f"✍️ Artikel schreiben mit {prompt_configs['write']['name']}...")
-        article_data = self.step_write_article(prompt_configs['write'], json_data, concept_json, model_settings)
+        with self._step_timer(timings, "write"):
+            article_data = self.step_write_article(prompt_configs['write'], json_data, concept_json, model_settings)
         results["article"] = article_data
         
         # 4. Check
         update_ui(f"🔍 Check mit {prompt_configs['check']['name']}...")
         
-        # Konvertierung für Check Input
-        article_text_for_check = json.dumps(article_data, ensure_ascii=False) if isinstance(article_data, dict) else str(article_data)
+        # Konvertierung für Check Input (nur die zu prüfenden Abschnitte)
+        article_text_for_check = self.article_for_check(article_data)
         
-        check_text = self.step_check(prompt_configs['check'], article_text_for_check, json_data, full_raw_input, model_settings)
+        with self._step_timer(timings, "check"):
+            check_text = self.step_check(prompt_configs['check'], article_text_for_check, json_data, full_raw_input, model_settings)
         results["check"] = check_text
+
+        # 5. Korrekturschleife (nur gemeldete Fehler, nur geänderte Abschnitte nachprüfen)
+        if prompt_configs.get('fix') and max_fix_iterations > 0:
+            article_data, check_text, fix_history = self.correction_loop(
+                prompt_configs, article_data, check_text, json_data, model_settings, max_fix_iterations, timings, update_ui
+            )
+            if fix_history:
+                results["check_initial"] = results["check"]
+                results["article"] = article_data
+                results["check"] = check_text
+                results["fix_history"] = fix_history
+
+        results["timings"] = timings
+        results["usage"] = self._run_local.usage
+        results["payload_stats"] = self._run_local.payload_stats
+        self._log_payload_savings(self._run_local.payload_stats)
+        self._run_local.usage = None
+        self._run_local.payload_stats = None
         
         return results
 
+    def correction_loop(self, prompt_configs, article_data, check_text, json_data, model_settings, max_iterations, timings, update_ui):
+        """Check -> Fix -> Re-Check, bis der Check grün ist, nichts mehr geändert wird oder das Limit erreicht ist"""
+        history = []
+        if not isinstance(article_data, dict) or "error" in article_data:
+            return article_data, check_text, history
+
+        for iteration in range(1, max_iterations + 1):
+            report = parse_check_report(check_text)
+            if not needs_fix(report):
+                break
+            errors = collect_check_errors(report)
+
+            update_ui(f"🩹 Korrektur {iteration}/{max_iterations} mit {prompt_configs['fix']['name']}...")
+            with self._step_timer(timings, f"fix_{iteration}"):
+                fixed = self.step_fix(prompt_configs['fix'], prompt_configs['write'], article_data, errors, json_data, model_settings, iteration)
+            if not isinstance(fixed, dict) or "error" in fixed:
+                update_ui("⚠️ Korrektur fehlgeschlagen, Artikel bleibt unverändert")
+                break
+
+            fixed_article, fix_meta = split_fix_output(fixed)
+            changed = changed_sections(article_data, fixed_article)
+            entry = {
+                "iteration": iteration,
+                "status_before": report.get("status"),
+                "fehler": errors,
+                "korrekturen": fix_meta["korrekturen_durchgefuehrt"],
+                "nicht_korrigiert": fix_meta["nicht_korrigiert"],
+                "geaenderte_abschnitte": changed,
+            }
+            history.append(entry)
+            if not changed:
+                break
+
+            article_before, article_data = article_data, merge_article(article_data, fixed_article)
+            update_ui(f"🔍 Nachprüfung: {', '.join(changed)}...")
+            with self._step_timer(timings, f"recheck_{iteration}"):
+                recheck_text = self.step_recheck(prompt_configs['check'], select_sections(article_data, changed), json_data, model_settings, iteration)
+            # Re-Check kennt nur die geänderten Abschnitte -> mit dem bisherigen Bericht zusammenführen
+            merged = merge_check_reports(report, parse_check_report(recheck_text), changed, article_before)
+            check_text = format_check_report(merged, f"_Zusammengeführter Prüfbericht nach Korrektur {iteration} (nachgeprüft: {', '.join(changed)})_")
+            entry["status_after"] = merged.get("status")
+
+        return article_data, check_text, history
+
+    def resolve_prompts(self, prompt_configs):
+        """Aufgelöste System-Prompts {step: text} eines Laufs (für den Run Store)"""
+        return {step: self.prompt_manager.load_prompt_by_config(config) for step, config in (prompt_configs or {}).items()}
+
+    def scrape_section(self, url_input, scraped_data):
+        """Scrape-Ergebnis als LLM-Text bzw. Fehlermarker"""
+        if "error" in scraped_data:
+            return f"[FEHLER BEIM SCRAPING VON {url_input}: {scraped_data['error']}]"
+        return self.scraper.format_for_llm(scraped_data)
+
+    def compose_raw_input(self, scraped_text, meta_input, text_input, file_content, extract_prompt_config, model_settings):
+        """Roh-Input für Extraktion und Check; Rückgabe: (Text, gekürzte Abschnitte)"""
+        sections, trimmed = self.fit_raw_input(
+            {"scrape": scraped_text, "meta": meta_input, "text": text_input, "attachments": file_content},
+            extract_prompt_config, model_settings
+        )
+        full_raw_input = (
+            f"--- WEB SCRAPE INPUT ---\n{sections['scrape']}\n\n"
+            f"--- MANUAL META INPUT ---\n{sections['meta']}\n\n"
+            f"--- MANUAL TEXT INPUT ---\n{sections['text']}\n\n"
+            f"--- FILE ATTACHMENTS ---\n{sections['attachments']}"
+        )
+        return full_raw_input, trimmed
+
+    def fit_raw_input(self, sections, extract_prompt_config, model_settings):
+        """
+        Kürzt die Roh-Input-Abschnitte auf das Budget der Extraktion. Reserviert wird
+        zusätzlich Platz für Extraktion + Artikel, die der Check neben dem Roh-Input bekommt.
+        """
+        model_name = (model_settings or {}).get("model") or self.config.MODEL_NAME
+        system_prompt = self.prompt_manager.load_prompt_by_config(extract_prompt_config)
+        reserve = output_limit_for("gemini-extraction", model_name) + output_limit_for("gemini-write-article", model_name)
+        return self.config.token_budget.fit_raw_input(model_name, "gemini-extraction", system_prompt, sections, reserve)
+
     # ----------------------------------------------------------------
     # SUB-STEPS
     # ----------------------------------------------------------------
@@ -122,59 +324,136 @@ class WorkflowProcessor:
     @observe() 
     def step_draft_concept(self, prompt_config, extraction_json, model_settings):
         system_prompt = self.prompt_manager.load_prompt_by_config(prompt_config)
-        json_str = json.dumps(extraction_json, ensure_ascii=False) if not isinstance(extraction_json, str) else extraction_json
-        return self._api_call(system_prompt, f"EXTRAHIERTE DATEN:\n{json_str}", True, model_settings, "gemini-draft-concept")
+        return self._api_call(system_prompt, self.draft_message(extraction_json), True, model_settings, "gemini-draft-concept")
 
     @observe() 
     def step_write_article(self, prompt_config, extraction_json, draft_json, model_settings):
         system_prompt = self.prompt_manager.load_prompt_by_config(prompt_config)
-        json1 = json.dumps(extraction_json, ensure_ascii=False)
-        json2 = json.dumps(draft_json, ensure_ascii=False)
-        user_msg = f"1. Extrahierte Daten (JSON):\n{json1}\n\n2. Redaktionsvorschläge (JSON):\n{json2}"
-        return self._api_call(system_prompt, user_msg, True, model_settings, "gemini-write-article")
+        return self._api_call(system_prompt, self.write_message(extraction_json, draft_json), True, model_settings, "gemini-write-article")
 
     @observe() 
     def step_check(self, prompt_config, article_text, extraction_json, original_input, model_settings):
         system_prompt = self.prompt_manager.load_prompt_by_config(prompt_config)
-        json_str = json.dumps(extraction_json, ensure_ascii=False)
-        user_msg = f"ORIGINAL INPUT (Rohdaten):\n{original_input}\n\nEXTRAHIERTE DATEN:\n{json_str}\n\nZU PRÜFENDER ARTIKEL:\n{article_text}"
-        return self._api_call(system_prompt, user_msg, False, model_settings, "gemini-final-check")
+        return self._api_call(system_prompt, self.check_message(article_text, extraction_json, original_input), False, model_settings, "gemini-final-check")
+
+    # User-Nachrichten der Schritte (auch vom Bulk-Modus genutzt)
+
+    def draft_message(self, extraction_json):
+        json_str = self._payload("draft", "extraction", extraction_json)
+        return f"EXTRAHIERTE DATEN:\n{json_str}"
+
+    def write_message(self, extraction_json, draft_json):
+        json1 = self._payload("write", "extraction", extraction_json)
+        json2 = self._payload("write", "concept", draft_json)
+        return f"1. Extrahierte Daten (JSON):\n{json1}\n\n2. Redaktionsvorschläge (JSON):\n{json2}"
+
+    def check_message(self, article_text, extraction_json, original_input):
+        json_str = self._payload("check", "extraction", extraction_json)
+        return f"ORIGINAL INPUT (Rohdaten):\n{original_input}\n\nEXTRAHIERTE DATEN:\n{json_str}\n\nZU PRÜFENDER ARTIKEL:\n{article_text}"
+
+    def article_for_check(self, article_data):
+        """Nur die zu prüfenden Abschnitte des Artikels"""
+        return self._payload("check", "article", article_data) if isinstance(article_data, dict) else str(article_data)
+
+    @observe()
+    def step_fix(self, prompt_config, write_prompt_config, article_data, errors, extraction_json, model_settings, iteration=1):
+        fix_prompt = self.prompt_manager.load_prompt_by_config(prompt_config)
+        write_prompt = self.prompt_manager.load_prompt_by_config(write_prompt_config)
+        system_prompt = build_fix_system_prompt(fix_prompt, write_prompt)
+        # Artikel vollständig (Fix gibt dasselbe Format zurück), nur kompakt serialisiert
+        article_str = compact_dumps(article_data)
+        errors_str = compact_dumps(errors)
+        json_str = self._payload("fix", "extraction", extraction_json)
+        user_msg = f"1. Originaler Artikel (JSON):\n{article_str}\n\n2. Fehlerliste aus Check (JSON):\n{errors_str}\n\n3. Original-Daten (JSON):\n{json_str}"
+        return self._api_call(system_prompt, user_msg, True, model_settings, f"gemini-fix-article-{iteration}")
+
+    @observe()
+    def step_recheck(self, prompt_config, changed_article, extraction_json, model_settings, iteration=1):
+        system_prompt = self.prompt_manager.load_prompt_by_config(prompt_config)
+        json_str = self._payload("check", "extraction", extraction_json)
+        article_str = compact_dumps(changed_article)
+        user_msg = (
+            f"EXTRAHIERTE DATEN:\n{json_str}\n\n"
+            f"ZU PRÜFENDE ABSCHNITTE (nach Korrektur; nur diese prüfen, alle anderen Abschnitte sind bereits geprüft):\n{article_str}"
+        )
+        return self._api_call(system_prompt, user_msg, False, model_settings, f"gemini-recheck-{iteration}")
 
     # ----------------------------------------------------------------
-    # API CALL (MIT FIX FÜR JSON CONTROL CHARS)
+    # API CALL (SCHEMA + LOKALE JSON-REPARATUR)
     # ----------------------------------------------------------------
 
-    def _api_call(self, system_prompt, user_input, json_mode, model_settings, name):
+    def prepare_request(self, system_prompt, user_input, json_mode, model_settings, name):
+        """Fertiger Request eines Schritts (Datum, Schema, Token-Budget) - synchron wie im Batch"""
         settings = model_settings or {"model": None, "temp": 0.1}
-        model_name = settings.get("model", DEFAULT_MODEL)
-        
-        date_str = self.get_date_string()
-        full_system_prompt = f"CURRENT DATE: {date_str}\n\n{system_prompt}"
-        
+        model_name = settings.get("model") or self.config.MODEL_NAME
+
+        # Datum gehört in die User-Nachricht: der System-Prompt bleibt so über Tage
+        # identisch und kann als Context Cache wiederverwendet werden
+        user_input = f"CURRENT DATE: {self.get_date_string()}\n\n{user_input}"
+
+        # Pre-Flight: passt der Request ins Kontextfenster? (TokenBudgetError, bevor Tokens anfallen)
+        plan = self.config.token_budget.plan(model_name, name, system_prompt, user_input)
+        return {
+            "name": name,
+            "model_name": model_name,
+            "settings": settings,
+            "system_prompt": system_prompt,
+            "user_input": user_input,
+            "json_mode": json_mode,
+            # Schema aus dem Output-Format des Prompts (None, wenn der Prompt keins enthält)
+            "response_schema": response_schema_for_prompt(system_prompt) if json_mode else None,
+            "plan": plan,
+        }
+
+    def _api_call(self, system_prompt, user_input, json_mode, model_settings, name):
+        request = self.prepare_request(system_prompt, user_input, json_mode, model_settings, name)
+        full_system_prompt, user_input = request["system_prompt"], request["user_input"]
+        model_name, settings, plan = request["model_name"], request["settings"], request["plan"]
+        response_schema = request["response_schema"]
+
+        if not json_mode:
+            return self._generate_text(full_system_prompt, user_input, model_name, settings, json_mode, name, None, plan)
+
+        # JSON-Schritte: erst lokal reparieren, nur wenn das scheitert genau diesen Schritt wiederholen
+        text = ""
+        for attempt in range(1, JSON_STEP_ATTEMPTS + 1):
+            text = self._generate_text(full_system_prompt, user_input, model_name, settings, json_mode, name, response_schema, plan)
+            try:
+                data, repaired = parse_json_text(text)
+                if repaired:
+                    self.logger.warning(f"{name}: JSON lokal repariert")
+                return restore_dynamic_keys_for_prompt(data, full_system_prompt) if response_schema else data
+            except JSONRepairError as e:
+                self.logger.warning(f"{name}: {e} (Versuch {attempt}/{JSON_STEP_ATTEMPTS})")
+        return self.json_error_stub(text)
+
+    def _generate_text(self, system_prompt, user_input, model_name, settings, json_mode, name, response_schema, plan=None):
         # Fallback ohne Langfuse
-        if not (self.config.enable_langfuse and LANGFUSE_AVAILABLE):
-            return self._execute_gemini(full_system_prompt, user_input, model_name, settings.get("temp"), json_mode)
+        langfuse = self.get_langfuse_client()
+        if langfuse is None:
+            return self._execute_gemini(system_prompt, user_input, model_name, settings.get("temp"), json_mode, name, response_schema, plan)
 
         try:
             # Langfuse Context Manager
-            langfuse = Langfuse()
-            
             with langfuse.start_as_current_generation(
                 name=name,
                 model=model_name,
-                model_parameters={"temperature": settings.get("temp"), "json_mode": json_mode},
-                input=[{"role": "system", "content": full_system_prompt}, {"role": "user", "content": user_input}]
+                model_parameters={"temperature": settings.get("temp"), "json_mode": json_mode, "max_output_tokens": (plan or {}).get("max_output_tokens")},
+                input=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_input}]
             ) as generation:
                 
                 response = self.config.generate_content(
                     user_content=user_input,
-                    system_instruction=full_system_prompt,
+                    system_instruction=system_prompt,
                     model_name=model_name,
                     temperature=settings.get("temp", 0.1),
-                    json_mode=json_mode
+                    json_mode=json_mode,
+                    response_schema=response_schema,
+                    max_output_tokens=(plan or {}).get("max_output_tokens", 8192)
                 )
                 
                 text_response = response.text
+                self._record_usage(name, model_name, response, plan)
                 
                 usage_dict = None
                 if hasattr(response, 'usage_metadata') and response.usage_metadata:
@@ -185,47 +464,49 @@ class WorkflowProcessor:
                     }
 
                 generation.update(output=text_response, usage=usage_dict)
-                
-                if json_mode:
-                    clean = text_response.replace("```json", "").replace("```", "").strip()
-                    try:
-                        # FIX: strict=False erlaubt Zeilenumbrüche in Strings!
-                        return json.loads(clean, strict=False)
-                    except json.JSONDecodeError as je:
-                        print(f"JSON Error: {je}")
-                        # Notfall-Rückgabe, damit der Workflow nicht crasht
-                        return {
-                            "error": "JSON Parsing Failed", 
-                            "raw_text": clean,
-                            "online": {"ueberschrift": "Fehler bei der Generierung", "body": clean},
-                            "print": {"text": "Formatierungsfehler"}
-                        }
                 return text_response
 
         except Exception as e:
             print(f"Tracking/API Error: {e}")
-            return self._execute_gemini(full_system_prompt, user_input, model_name, settings.get("temp"), json_mode)
+            return self._execute_gemini(system_prompt, user_input, model_name, settings.get("temp"), json_mode, name, response_schema, plan)
 
-    def _execute_gemini(self, system_prompt, user_input, model, temp, json_mode):
+    def _execute_gemini(self, system_prompt, user_input, model, temp, json_mode, name=None, response_schema=None, plan=None):
         response = self.config.generate_content(
             user_content=user_input, 
             system_instruction=system_prompt, 
             model_name=model, 
             temperature=temp, 
-            json_mode=json_mode
+            json_mode=json_mode,
+            response_schema=response_schema,
+            max_output_tokens=(plan or {}).get("max_output_tokens", 8192)
         )
-        text = response.text
-        if json_mode:
-            clean = text.replace("```json", "").replace("```", "").strip()
-            try:
-                return json.loads(clean, strict=False) # Auch hier strict=False
-            except Exception:
-                return {"error": "JSON Parsing Failed", "raw_text": text}
-        return text
+        if name:
+            self._record_usage(name, model, response, plan)
+        return response.text
+
+    @staticmethod
+    def json_error_stub(text):
+        """Notfall-Rückgabe, damit der Workflow nicht crasht"""
+        clean = strip_fences(text)
+        return {
+            "error": "JSON Parsing Failed", 
+            "raw_text": clean,
+            "online": {"ueberschrift": "Fehler bei der Generierung", "body": clean},
+            "print": {"text": "Formatierungsfehler"}
+        }
+
+    @classmethod
+    def parse_json_response(cls, text):
+        """Parsed die Antwort (inkl. lokaler Reparatur); bei Fehlern ein Notfall-Objekt"""
+        try:
+            return parse_json_text(text)[0]
+        except JSONRepairError as e:
+            print(f"JSON Error: {e}")
+            return cls.json_error_stub(text)
 
     def flush_stats(self):
-        if self.config.enable_langfuse and LANGFUSE_AVAILABLE:
+        langfuse = self.get_langfuse_client()
+        if langfuse is not None:
             try:
-                from langfuse import flush
-                flush()
+                langfuse.flush()
             except Exception: pass